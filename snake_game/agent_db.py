@@ -0,0 +1,241 @@
+# agent_db.py
+#
+# Optional SQLite store for agents, their hyperparameters, per-episode
+# summaries and Q-table snapshots. The JSON and pickle files in the agents
+# folder stay the primary copy; with rl_agent.AGENT_DB set, training mirrors
+# everything into the database as well, so questions across agents are one
+# indexed query:
+#
+#     python snake_game/agent_db.py agents/agents.db --import agents
+#     python snake_game/agent_db.py agents/agents.db --best 1000
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from q_table import QTable, load_saved_table
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agents (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    learning_cycles INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+-- One row per setting, values as JSON
+CREATE TABLE IF NOT EXISTS hyperparameters (
+    agent_id INTEGER NOT NULL REFERENCES agents (id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (agent_id, key)
+);
+
+CREATE TABLE IF NOT EXISTS episodes (
+    id INTEGER PRIMARY KEY,
+    agent_id INTEGER NOT NULL REFERENCES agents (id) ON DELETE CASCADE,
+    episode INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    steps INTEGER NOT NULL,
+    exploration_rate REAL NOT NULL,
+    duration REAL NOT NULL,
+    seed INTEGER,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS episodes_agent ON episodes (agent_id, episode);
+CREATE INDEX IF NOT EXISTS episodes_time ON episodes (finished_at);
+
+CREATE TABLE IF NOT EXISTS q_snapshots (
+    id INTEGER PRIMARY KEY,
+    agent_id INTEGER NOT NULL REFERENCES agents (id) ON DELETE CASCADE,
+    learning_cycles INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS q_snapshots_agent ON q_snapshots (agent_id, created_at);
+"""
+
+# Agent settings that are stored as columns or not at all
+_NOT_HYPERPARAMETERS = {"name", "learning_cycles", "history"}
+
+
+class AgentDB:
+    """An agents database at ``path``, created on first use.
+
+    Writes are committed per call. The database runs in WAL mode, so several
+    training processes can write to it while others read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _agent_id(self, name):
+        row = self.conn.execute("SELECT id FROM agents WHERE name = ?", (name,))
+        row = row.fetchone()
+        return row[0] if row else None
+
+    def save_agent(self, agent_data):
+        """Insert or update an agent and its hyperparameters."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO agents (name, learning_cycles, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (name) DO UPDATE SET"
+                " learning_cycles = excluded.learning_cycles,"
+                " updated_at = excluded.updated_at",
+                (agent_data["name"], agent_data.get("learning_cycles", 0), now, now),
+            )
+            agent_id = self._agent_id(agent_data["name"])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO hyperparameters (agent_id, key, value)"
+                " VALUES (?, ?, ?)",
+                [
+                    (agent_id, key, json.dumps(value))
+                    for key, value in agent_data.items()
+                    if key not in _NOT_HYPERPARAMETERS
+                ],
+            )
+
+    def load_agent(self, name):
+        """The agent's settings as ``rl_agent.load_agent`` returns them, or None."""
+        row = self.conn.execute(
+            "SELECT id, learning_cycles FROM agents WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            return None
+        agent_id, learning_cycles = row
+        agent_data = {"name": name, "learning_cycles": learning_cycles}
+        for key, value in self.conn.execute(
+            "SELECT key, value FROM hyperparameters WHERE agent_id = ?", (agent_id,)
+        ):
+            agent_data[key] = json.loads(value)
+        agent_data["history"] = []
+        return agent_data
+
+    def list_agents(self):
+        return [row[0] for row in self.conn.execute("SELECT name FROM agents")]
+
+    def add_episodes(self, name, episodes):
+        """Record episode summaries for an existing agent.
+
+        ``episodes`` are ``(episode, score, steps, exploration_rate, duration,
+        seed)`` tuples; they're written in one transaction.
+        """
+        agent_id = self._agent_id(name)
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO episodes (agent_id, episode, score, steps,"
+                " exploration_rate, duration, seed, finished_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(agent_id, *episode, now) for episode in episodes],
+            )
+
+    def episodes(self, name, last=None):
+        """An agent's episode summaries in order, optionally only the ``last`` N."""
+        rows = self.conn.execute(
+            "SELECT episode, score, steps, exploration_rate, duration, seed"
+            " FROM episodes WHERE agent_id = ? ORDER BY episode DESC"
+            " LIMIT ?",
+            (self._agent_id(name), -1 if last is None else last),
+        ).fetchall()
+        rows.reverse()
+        return rows
+
+    def save_q_snapshot(self, name, q_table, learning_cycles):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO q_snapshots (agent_id, learning_cycles, created_at, data)"
+                " VALUES (?, ?, ?, ?)",
+                (
+                    self._agent_id(name),
+                    learning_cycles,
+                    time.time(),
+                    q_table.to_bytes(),
+                ),
+            )
+
+    def load_q_snapshot(self, name, learning_cycles=None):
+        """The agent's newest Q-table snapshot (at ``learning_cycles``, if given)."""
+        query = "SELECT data FROM q_snapshots WHERE agent_id = ?"
+        params = [self._agent_id(name)]
+        if learning_cycles is not None:
+            query += " AND learning_cycles = ?"
+            params.append(learning_cycles)
+        row = self.conn.execute(query + " ORDER BY id DESC LIMIT 1", params)
+        row = row.fetchone()
+        return QTable.from_bytes(row[0]) if row else None
+
+    def best_agents(self, last=1000, limit=10):
+        """``(name, mean score, episodes)`` over each agent's ``last`` episodes, best first."""
+        return self.conn.execute(
+            "SELECT name, AVG(score), COUNT(*) FROM ("
+            "  SELECT agent_id, score, ROW_NUMBER() OVER ("
+            "    PARTITION BY agent_id ORDER BY episode DESC) AS recent"
+            "  FROM episodes)"
+            " JOIN agents ON agents.id = agent_id"
+            " WHERE recent <= ?"
+            " GROUP BY agent_id ORDER BY AVG(score) DESC LIMIT ?",
+            (last, limit),
+        ).fetchall()
+
+    def import_agent_folder(self, folder):
+        """Register every agent JSON in ``folder``, with its Q-table if present.
+
+        Returns the names imported.
+        """
+        names = []
+        for filename in sorted(os.listdir(folder)):
+            if not filename.endswith(".json") or filename.endswith("_high_scores.json"):
+                continue
+            with open(os.path.join(folder, filename)) as f:
+                agent_data = json.load(f)
+            self.save_agent(agent_data)
+            q_path = os.path.join(folder, f"{agent_data['name']}_q_table")
+            q_table = load_saved_table(
+                f"{q_path}.bin", f"{q_path}.delta", f"{q_path}.pkl"
+            )
+            if q_table is not None:
+                self.save_q_snapshot(
+                    agent_data["name"], q_table, agent_data.get("learning_cycles", 0)
+                )
+            names.append(agent_data["name"])
+        return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or fill an agents database.")
+    parser.add_argument("database", help="Path to the SQLite database")
+    parser.add_argument(
+        "--import", dest="folder", help="Import the agents in this folder first"
+    )
+    parser.add_argument(
+        "--best",
+        type=int,
+        default=1000,
+        help="Rank agents by mean score over this many recent episodes",
+    )
+    args = parser.parse_args()
+
+    db = AgentDB(args.database)
+    if args.folder:
+        for name in db.import_agent_folder(args.folder):
+            print(f"Imported {name}")
+    for name, mean_score, episodes in db.best_agents(args.best):
+        print(f"{name:<20} {mean_score:8.2f} over {episodes} episodes")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
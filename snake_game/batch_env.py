@@ -0,0 +1,175 @@
+# batch_env.py
+#
+# Vectorized version of SnakeEnv: N independent games are kept as NumPy arrays
+# and advanced together with one call to step().
+
+import numpy as np
+
+import directions
+from directions import DOWN, LEFT, RIGHT, UP
+from snake_env import board_height, board_width, start_body
+
+# The direction tables as arrays, indexed by action/heading (UP, DOWN, LEFT,
+# RIGHT, as in snake_env.ACTIONS)
+DX = np.array([dx for dx, _ in directions.DELTAS])
+DY = np.array([dy for _, dy in directions.DELTAS])
+TURN_LEFT = np.array(directions.TURN_LEFT)
+TURN_RIGHT = np.array(directions.TURN_RIGHT)
+
+
+class BatchSnakeEnv:
+    """N games of snake stepped in lockstep.
+
+    Positions are grid cells rather than pixels. Each body is a ring buffer of
+    flat cell indices (``y * width + x``) with a per-game head pointer and
+    length, mirrored by a boolean occupancy grid so collision checks are a
+    single fancy-indexing lookup.
+
+    ``step(actions)`` takes an int array of action indices and returns
+    ``(next_states, rewards, dones)``. Rows that ended are reset straight
+    away; ``next_states`` still holds their terminal state for the Q update,
+    while ``self.states`` holds the state to act on next.
+    """
+
+    def __init__(self, num_envs, width=None, height=None, seed=None):
+        self.num_envs = num_envs
+        self.width = width or board_width
+        self.height = height or board_height
+        # Same starting snake as SnakeEnv, tail first
+        self.start_body = [
+            tuple(block) for block in start_body(self.width, self.height)
+        ]
+        self.start_body.reverse()
+        self.num_cells = self.width * self.height
+        self.rng = np.random.default_rng(seed)
+
+        cell_dtype = np.int16 if self.num_cells < 2**15 else np.int32
+        self.rows = np.arange(num_envs)
+        self.body = np.zeros((num_envs, self.num_cells), dtype=cell_dtype)
+        self.occupied = np.zeros((num_envs, self.num_cells), dtype=bool)
+        self.head_ptr = np.zeros(num_envs, dtype=np.int32)
+        self.length = np.zeros(num_envs, dtype=np.int32)
+        self.head_x = np.zeros(num_envs, dtype=np.int32)
+        self.head_y = np.zeros(num_envs, dtype=np.int32)
+        self.direction = np.zeros(num_envs, dtype=np.int8)
+        self.food_x = np.zeros(num_envs, dtype=np.int32)
+        self.food_y = np.zeros(num_envs, dtype=np.int32)
+        self.scores = np.zeros(num_envs, dtype=np.int32)
+        self.steps = np.zeros(num_envs, dtype=np.int32)
+
+        # Score and length of the most recently finished game in each row
+        self.final_scores = np.zeros(num_envs, dtype=np.int32)
+        self.final_steps = np.zeros(num_envs, dtype=np.int32)
+        self.episodes_done = 0
+
+        self.states = self.reset()
+
+    def reset(self, mask=None):
+        """Reset the games selected by ``mask`` (all of them by default)."""
+        if mask is None:
+            mask = np.ones(self.num_envs, dtype=bool)
+        rows = self.rows[mask]
+        if rows.size == 0:
+            return self.get_states()
+
+        self.occupied[rows] = False
+        for i, (x, y) in enumerate(self.start_body):
+            cell = y * self.width + x
+            self.body[rows, i] = cell
+            self.occupied[rows, cell] = True
+        head_x, head_y = self.start_body[-1]
+        self.head_ptr[rows] = len(self.start_body) - 1
+        self.length[rows] = len(self.start_body)
+        self.head_x[rows] = head_x
+        self.head_y[rows] = head_y
+        self.direction[rows] = RIGHT
+        self.scores[rows] = 0
+        self.steps[rows] = 0
+        self._spawn_food(rows)
+        return self.get_states()
+
+    def _spawn_food(self, rows):
+        # Same distribution as SnakeEnv: uniform over the cells the snake
+        # doesn't cover. Random keys with occupied cells masked out, so the
+        # argmax is a uniform pick among the free ones
+        keys = self.rng.random((rows.size, self.num_cells))
+        keys[self.occupied[rows]] = -1.0
+        cell = keys.argmax(axis=1)
+        self.food_x[rows] = cell % self.width
+        self.food_y[rows] = cell // self.width
+
+    def _is_blocked(self, x, y):
+        out = (x < 0) | (x >= self.width) | (y < 0) | (y >= self.height)
+        cell = np.where(out, 0, y * self.width + x)
+        return out | self.occupied[self.rows, cell]
+
+    def get_states(self):
+        """The 11 features of ``get_state`` for every game, as an (N, 11) array."""
+        d = self.direction
+        states = np.empty((self.num_envs, 11), dtype=bool)
+        for col, turn in enumerate((d, TURN_LEFT[d], TURN_RIGHT[d])):
+            states[:, col] = self._is_blocked(
+                self.head_x + DX[turn], self.head_y + DY[turn]
+            )
+        states[:, 3] = d == LEFT
+        states[:, 4] = d == RIGHT
+        states[:, 5] = d == UP
+        states[:, 6] = d == DOWN
+        states[:, 7] = self.food_x < self.head_x
+        states[:, 8] = self.food_x > self.head_x
+        states[:, 9] = self.food_y < self.head_y
+        states[:, 10] = self.food_y > self.head_y
+        return states
+
+    def step(self, actions):
+        # Reversing runs into the neck and ends the game, as in SnakeEnv
+        actions = np.asarray(actions)
+        self.direction[:] = actions
+
+        head_x = self.head_x + DX[actions]
+        head_y = self.head_y + DY[actions]
+        out = (
+            (head_x < 0)
+            | (head_x >= self.width)
+            | (head_y < 0)
+            | (head_y >= self.height)
+        )
+        ate = ~out & (head_x == self.food_x) & (head_y == self.food_y)
+
+        # The tail moves away before the head arrives, unless the snake grows
+        tail_ptr = (self.head_ptr - self.length + 1) % self.num_cells
+        tail_cell = self.body[self.rows, tail_ptr]
+        moved = ~ate
+        self.occupied[self.rows[moved], tail_cell[moved]] = False
+        self.length += ate
+
+        cell = np.where(out, 0, head_y * self.width + head_x)
+        hit_self = ~out & self.occupied[self.rows, cell]
+        dones = out | hit_self
+
+        self.head_ptr = (self.head_ptr + 1) % self.num_cells
+        self.body[self.rows, self.head_ptr] = cell
+        inside = self.rows[~out]
+        self.occupied[inside, cell[~out]] = True
+        self.head_x = head_x.astype(np.int32)
+        self.head_y = head_y.astype(np.int32)
+
+        self.scores += ate
+        self.steps += 1
+        if ate.any():
+            self._spawn_food(self.rows[ate])
+
+        rewards = np.where(ate, 10.0, -0.1)
+        rewards[dones] = -100.0
+        next_states = self.get_states()
+        # A snake that fills the board has nothing left to eat: the game is won
+        dones |= self.length == self.num_cells
+
+        if dones.any():
+            self.final_scores[dones] = self.scores[dones]
+            self.final_steps[dones] = self.steps[dones]
+            self.episodes_done += int(dones.sum())
+            self.states = self.reset(dones)
+        else:
+            self.states = next_states
+        return next_states, rewards, dones
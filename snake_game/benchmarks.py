@@ -0,0 +1,478 @@
+# benchmarks.py
+#
+# Headless benchmarks for the game logic, the learner and agent storage:
+#
+#     python snake_game/benchmarks.py --output bench.json
+#     python snake_game/benchmarks.py --baseline bench.json
+#
+# Results are written as JSON; comparing against a stored baseline exits
+# with status 1 if any benchmark got more than --tolerance worse.
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import timeit
+import types
+
+import numpy as np
+
+import rl_agent
+from batch_env import BatchSnakeEnv
+from directions import RIGHT
+from free_cells import FreeCells
+from q_table import QTable, decode_state
+from safety import safe_actions
+from snake_body import SnakeBody
+from snake_env import (
+    ACTIONS,
+    SnakeEnv,
+    board_height,
+    board_width,
+    get_state,
+    is_collision,
+    new_snake_body,
+)
+from state_encoders import ENCODERS
+
+
+def board_cycle():
+    """A Hamiltonian cycle over the board, as grid cells.
+
+    Walks row 0 left to right, snakes back and forth through columns 1.. of
+    the remaining rows and returns up column 0, so a snake following it never
+    runs into itself, whatever its length.
+    """
+    cols = board_width
+    rows = board_height
+    cycle = [(x, 0) for x in range(cols)]
+    for y in range(1, rows):
+        xs = range(cols - 1, 0, -1) if y % 2 else range(1, cols)
+        cycle.extend((x, y) for x in xs)
+    cycle.extend((0, y) for y in range(rows - 1, 0, -1))
+    return cycle
+
+
+def snake_lengths():
+    return [3, 100, 1000, len(board_cycle()) - 1]
+
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def bench_snake_body(lengths=None, steps=2000):
+    """Per-step cost of moving a snake of each length along ``board_cycle``.
+
+    A step is one move plus the four collision queries ``rl_main`` makes
+    (straight, left, right and the game-over check). The list version is the
+    old ``snake_body.insert``/``pop`` and ``point in snake_body[1:]`` code.
+    """
+    cycle = board_cycle()
+    n = len(cycle)
+    lengths = lengths or [3, 100, 500, 1000, 2000, n - 1]
+    results = []
+
+    for length in lengths:
+        blocks = [cycle[i] for i in range(length - 1, -1, -1)]
+        neighbours = [(1, 0), (0, 1), (-1, 0)]
+
+        as_list = [list(b) for b in blocks]
+        list_pos = [length - 1]
+
+        def list_step():
+            i = list_pos[0] = (list_pos[0] + 1) % n
+            head = list(cycle[i])
+            as_list.insert(0, head)
+            as_list.pop()
+            for dx, dy in neighbours:
+                [head[0] + dx, head[1] + dy] in as_list[1:]
+            head in as_list[1:]
+
+        body = SnakeBody(blocks)
+        body_pos = [length - 1]
+
+        def body_step():
+            i = body_pos[0] = (body_pos[0] + 1) % n
+            head = cycle[i]
+            body.move(head)
+            for dx, dy in neighbours:
+                body.collides((head[0] + dx, head[1] + dy))
+            body.collides(head)
+
+        results.append(
+            (length, per_call_us(list_step, steps), per_call_us(body_step, steps))
+        )
+    return results
+
+
+def bench_food_spawn(number=5000):
+    """Microseconds per snake step plus food draw, with the free-cell index."""
+    cycle = board_cycle()
+    n = len(cycle)
+    rng = random.Random(0)
+    results = {}
+    for length in snake_lengths():
+        free_cells = FreeCells(board_width, board_height)
+        body = SnakeBody([cycle[i] for i in range(length - 1, -1, -1)], free_cells)
+        pos = [length - 1]
+
+        def step():
+            i = pos[0] = (pos[0] + 1) % n
+            body.move(cycle[i])
+            free_cells.sample(rng)
+
+        results[length] = per_call_us(step, number)
+    return results
+
+
+def bench_env_steps(steps=20000, width=board_width, height=board_height):
+    """Raw SnakeEnv steps per second with random (non-reversing) actions."""
+    env = SnakeEnv(0, width, height)
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(steps):
+        action = rng.choice(rl_agent.valid_actions_for(env.heading))
+        _, _, done = env.step(action)
+        if done:
+            env.reset()
+    return steps / (time.perf_counter() - start)
+
+
+def bench_batch_env_steps(num_envs=1024, steps=200):
+    """Game steps per second summed over a BatchSnakeEnv."""
+    env = BatchSnakeEnv(num_envs, seed=0)
+    rng = np.random.default_rng(0)
+    actions = rng.integers(0, 4, size=(steps, num_envs))
+    start = time.perf_counter()
+    for step_actions in actions:
+        env.step(step_actions)
+    return num_envs * steps / (time.perf_counter() - start)
+
+
+def bench_get_state(number=5000):
+    """Microseconds per ``get_state`` call for each snake length."""
+    cycle = board_cycle()
+    results = {}
+    for length in snake_lengths():
+        body = SnakeBody([cycle[i] for i in range(length - 1, -1, -1)])
+        head = list(body.head)
+        food = [32, 24]
+        results[length] = per_call_us(
+            lambda: get_state(head, body, food, "RIGHT"), number
+        )
+    return results
+
+
+def bench_state_encoders(number=5000):
+    """Microseconds per ``encode`` call for each state encoder and snake length."""
+    cycle = board_cycle()
+    results = {}
+    for length in snake_lengths():
+        blocks = [cycle[i] for i in range(length - 1, -1, -1)]
+        env = types.SimpleNamespace(
+            width=board_width,
+            height=board_height,
+            snake_body=new_snake_body(blocks),
+            snake_pos=list(blocks[0]),
+            food_pos=[32, 24],
+            heading=RIGHT,
+        )
+        for encoder_id, encoder in ENCODERS.items():
+            results[encoder_id, length] = per_call_us(
+                lambda: encoder.encode(env), number
+            )
+    return results
+
+
+def bench_safety(number=200):
+    """Microseconds per ``safe_actions`` call (one step's mask) per snake length.
+
+    The snake lies along the board cycle with its head at the end of it, so
+    the searches cross the whole free part of the board to find the tail.
+    """
+    cycle = board_cycle()
+    results = {}
+    for length in snake_lengths():
+        blocks = [cycle[i] for i in range(length - 1, -1, -1)]
+        env = types.SimpleNamespace(
+            width=board_width,
+            height=board_height,
+            snake_body=new_snake_body(blocks),
+            snake_pos=list(blocks[0]),
+            food_pos=[32, 24],
+            heading=RIGHT,
+        )
+        results[length] = per_call_us(lambda: safe_actions(env, ACTIONS), number)
+    return results
+
+
+def bench_is_collision(number=20000):
+    cycle = board_cycle()
+    body = SnakeBody([cycle[i] for i in range(999, -1, -1)])
+    point = [cycle[500][0], cycle[500][1]]
+    return per_call_us(lambda: is_collision(point, body), number)
+
+
+def _filled_q_table(fill=1.0):
+    # ``fill`` of the states visited, in every action; 1.0 is the worst case
+    # for saving
+    table = QTable()
+    rng = np.random.default_rng(0)
+    states = rng.permutation(len(table.values))[: round(fill * len(table.values))]
+    table.values[states] = rng.normal(size=(len(states), table.values.shape[1]))
+    table.visited[states] = True
+    return table
+
+
+def bench_learner(number=20000):
+    """Calls per second of ``choose_action`` and ``update_q_table``."""
+    rl_agent.Q_table = _filled_q_table()
+    agent_data = {
+        "exploration_rate": 0.1,
+        "learning_rate": 0.1,
+        "discount_factor": 0.9,
+    }
+    states = [decode_state(code) for code in range(2048)]
+    rng = random.Random(0)
+    pairs = [(rng.choice(states), rng.choice(states)) for _ in range(1024)]
+    counter = [0]
+
+    def choose():
+        state, _ = pairs[counter[0] % 1024]
+        counter[0] += 1
+        rl_agent.choose_action(state, ACTIONS, agent_data, "learning")
+
+    def update():
+        state, next_state = pairs[counter[0] % 1024]
+        counter[0] += 1
+        rl_agent.update_q_table(
+            state,
+            "UP",
+            -0.1,
+            next_state,
+            agent_data,
+            [10, 5],
+            [20, 5],
+            [11, 5],
+            [20, 5],
+        )
+
+    return 1e6 / per_call_us(choose, number), 1e6 / per_call_us(update, number)
+
+
+def bench_training_episodes(episodes=50):
+    """Headless training episodes per second, without any file I/O.
+
+    The games and the exploration are seeded, so every run plays the same
+    games and a slowdown against a baseline isn't just a run of longer ones.
+    """
+    rl_agent.Q_table = QTable()
+    agent_data = {
+        "exploration_rate": 0.1,
+        "exploration_decay": 0.995,
+        "min_exploration_rate": 0.1,
+        "learning_rate": 0.1,
+        "discount_factor": 0.9,
+    }
+    env = SnakeEnv(0)
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(episodes):
+        rl_agent.play_episode(env, agent_data, "learning", rng=rng)
+    return episodes / (time.perf_counter() - start)
+
+
+def best_ms(setup, func, repeat=5):
+    """Fastest of ``repeat`` timed calls of ``func``, each after ``setup()``."""
+    times = []
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def bench_storage(history_lengths=(100, 1000, 10000), fills=(0.01, 0.1, 0.5, 1.0)):
+    """Milliseconds to save and load an agent JSON and its Q-table.
+
+    Q-table saves are measured as a full snapshot and as a delta checkpoint,
+    and the Q-table as it fills up: with ``fill`` of its states visited, a
+    full save, a delta holding every visited state on top of a fresh
+    snapshot, and a load of the two.
+
+    The agent file is measured with an inline ``history`` of each length, as
+    older agent files carried, to show how load time grows with it.
+    """
+    results = {}
+    saved_folder = rl_agent.AGENT_FOLDER
+    with tempfile.TemporaryDirectory() as folder:
+        rl_agent.AGENT_FOLDER = folder
+        try:
+            state = decode_state(1234)
+            for length in history_lengths:
+                agent_data = {
+                    "name": "bench",
+                    "learning_rate": 0.1,
+                    "discount_factor": 0.9,
+                    "exploration_rate": 0.1,
+                    "exploration_decay": 0.995,
+                    "min_exploration_rate": 0.1,
+                    "learning_cycles": 0,
+                    "history": [(state, "UP", -0.1, state)] * length,
+                }
+                with open(os.path.join(folder, "bench.json"), "w") as f:
+                    json.dump(agent_data, f)
+                results[f"load_agent_ms[history={length}]"] = (
+                    per_call_us(lambda: rl_agent.load_agent("bench"), 5) / 1000
+                )
+            results["save_agent_ms"] = (
+                per_call_us(lambda: rl_agent.save_agent(agent_data), 5) / 1000
+            )
+
+            rl_agent.Q_table = _filled_q_table()
+            results["save_q_table_full_ms"] = (
+                per_call_us(lambda: rl_agent.save_q_table("bench", full=True), 5) / 1000
+            )
+            # About as many states as a game updates between checkpoints
+            touched = np.arange(0, len(rl_agent.Q_table.values), 64)
+
+            def save_delta():
+                rl_agent.Q_table.dirty[touched] = True
+                rl_agent.save_q_table("bench")
+
+            results[f"save_q_table_delta_ms[states={len(touched)}]"] = (
+                per_call_us(save_delta, 5) / 1000
+            )
+            results["load_q_table_ms"] = (
+                per_call_us(lambda: rl_agent.load_q_table("bench"), 5) / 1000
+            )
+            results["open_q_snapshot_ms"] = (
+                per_call_us(lambda: rl_agent.open_q_snapshot("bench", folder), 5) / 1000
+            )
+
+            for fill in fills:
+                rl_agent.Q_table = table = _filled_q_table(fill)
+                results[f"save_q_table_full_ms[fill={fill}]"] = (
+                    per_call_us(lambda: rl_agent.save_q_table("bench", full=True), 5)
+                    / 1000
+                )
+
+                def mark_visited():
+                    rl_agent.Q_table = table
+                    rl_agent.save_q_table("bench", full=True)
+                    table.dirty[:] = table.visited.any(axis=1)
+
+                results[f"save_q_table_delta_ms[fill={fill}]"] = best_ms(
+                    mark_visited, lambda: rl_agent.save_q_table("bench")
+                )
+                results[f"load_q_table_ms[fill={fill}]"] = (
+                    per_call_us(lambda: rl_agent.load_q_table("bench"), 5) / 1000
+                )
+        finally:
+            rl_agent.AGENT_FOLDER = saved_folder
+    return results
+
+
+def run_all():
+    """Run every benchmark; returns ``{name: (value, unit, higher_is_better)}``."""
+    results = {}
+    results["env_steps_per_s"] = (bench_env_steps(), "steps/s", True)
+    results["env_steps_per_s[10x10]"] = (
+        bench_env_steps(width=10, height=10),
+        "steps/s",
+        True,
+    )
+    results["batch_env_steps_per_s"] = (bench_batch_env_steps(), "steps/s", True)
+    for length, list_us, body_us in bench_snake_body(snake_lengths()):
+        results[f"snake_body_step_us[len={length}]"] = (body_us, "us", False)
+        results[f"snake_body_step_us[list,len={length}]"] = (list_us, "us", False)
+    for length, us in bench_food_spawn().items():
+        results[f"food_spawn_us[len={length}]"] = (us, "us", False)
+    for length, us in bench_get_state().items():
+        results[f"get_state_us[len={length}]"] = (us, "us", False)
+    for (encoder_id, length), us in bench_state_encoders().items():
+        results[f"encode_{encoder_id}_us[len={length}]"] = (us, "us", False)
+    for length, us in bench_safety().items():
+        results[f"safe_actions_us[len={length}]"] = (us, "us", False)
+    results["is_collision_us"] = (bench_is_collision(), "us", False)
+    choose_rate, update_rate = bench_learner()
+    results["choose_action_per_s"] = (choose_rate, "calls/s", True)
+    results["update_q_table_per_s"] = (update_rate, "calls/s", True)
+    results["training_episodes_per_s"] = (
+        bench_training_episodes(),
+        "episodes/s",
+        True,
+    )
+    for name, ms in bench_storage().items():
+        results[name] = (ms, "ms", False)
+    return results
+
+
+def to_json(results):
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "benchmarks": {
+            name: {"value": value, "unit": unit, "higher_is_better": higher}
+            for name, (value, unit, higher) in results.items()
+        },
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Names of the benchmarks more than ``tolerance`` worse than ``baseline``."""
+    regressions = []
+    for name, base in baseline["benchmarks"].items():
+        if name not in current["benchmarks"]:
+            continue
+        value = current["benchmarks"][name]["value"]
+        if base["higher_is_better"]:
+            worse = value < base["value"] * (1 - tolerance)
+        else:
+            worse = value > base["value"] * (1 + tolerance)
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the snake benchmarks.")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against this results file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed slowdown against the baseline, as a fraction",
+    )
+    args = parser.parse_args()
+
+    current = to_json(run_all())
+    for name, result in current["benchmarks"].items():
+        print(f"{name:<40} {result['value']:>14.2f} {result['unit']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        for name in regressions:
+            new = current["benchmarks"][name]["value"]
+            old = baseline["benchmarks"][name]["value"]
+            print(f"REGRESSION {name}: {old:.2f} -> {new:.2f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# directions.py
+#
+# Headings as small ints, with everything the step loop needs to know about
+# them precomputed, so moving, turning and danger checks are tuple or dict
+# lookups instead of chains of string comparisons.
+#
+# Absolute actions are the heading names ("UP", ...). Agents can instead act
+# relative to their heading with "STRAIGHT", "TURN_LEFT" and "TURN_RIGHT";
+# those are always all valid, so their mask never changes.
+
+UP, DOWN, LEFT, RIGHT = range(4)
+
+# Heading names, in the order of snake_env.ACTIONS
+DIRECTIONS = ("UP", "DOWN", "LEFT", "RIGHT")
+
+# Heading -> (dx, dy) of one step
+DELTAS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+OPPOSITE = (DOWN, UP, RIGHT, LEFT)
+TURN_LEFT = (LEFT, RIGHT, DOWN, UP)
+TURN_RIGHT = (RIGHT, LEFT, UP, DOWN)
+
+RELATIVE_ACTIONS = ("STRAIGHT", "TURN_LEFT", "TURN_RIGHT")
+
+# Heading name or int -> int, for code that may be handed either
+HEADINGS = {
+    **{name: d for d, name in enumerate(DIRECTIONS)},
+    **{d: d for d in range(4)},
+}
+
+# Heading -> action name (absolute or relative) -> new heading. Reversing
+# maps to the reverse heading, which runs into the neck, as it always has
+STEPS = tuple(
+    {
+        **{name: d for d, name in enumerate(DIRECTIONS)},
+        "STRAIGHT": heading,
+        "TURN_LEFT": TURN_LEFT[heading],
+        "TURN_RIGHT": TURN_RIGHT[heading],
+    }
+    for heading in range(4)
+)
+
+# Heading (name or int) -> the absolute actions that don't reverse, in
+# DIRECTIONS order. Shared tuples: callers must not modify them
+VALID_ACTIONS = {}
+for _heading, _name in enumerate(DIRECTIONS):
+    VALID_ACTIONS[_heading] = VALID_ACTIONS[_name] = tuple(
+        name for name in DIRECTIONS if name != DIRECTIONS[OPPOSITE[_heading]]
+    )
+
+# Heading -> (dx, dy) of going straight, turning left and turning right
+LOOKAHEAD = tuple(
+    (DELTAS[d], DELTAS[TURN_LEFT[d]], DELTAS[TURN_RIGHT[d]]) for d in range(4)
+)
+
+# Heading -> the absolute actions going straight, turning left and right
+TURNS = tuple(
+    (DIRECTIONS[d], DIRECTIONS[TURN_LEFT[d]], DIRECTIONS[TURN_RIGHT[d]])
+    for d in range(4)
+)
+
+# Heading -> the "moving left/right/up/down" features of snake_env.get_state
+MOVING = tuple((d == LEFT, d == RIGHT, d == UP, d == DOWN) for d in range(4))
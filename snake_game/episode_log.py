@@ -0,0 +1,163 @@
+# episode_log.py
+#
+# Append-only binary log of every training step, one file per agent. Each
+# episode is a header (score, number of steps, episode seed) followed by one
+# fixed-size record per step, so writing a game costs the same however long
+# the agent has been training. The seed and the logged actions are enough to
+# replay the game exactly (see game_record.py).
+#
+# Files start with LOG_MAGIC.
+
+import gzip
+import os
+import struct
+import zlib
+
+from directions import RELATIVE_ACTIONS
+from q_table import NUM_FEATURES, decode_state, encode_state
+from snake_env import ACTIONS
+
+LOG_MAGIC = b"SNAKELOG\x02"
+EPISODE_HEADER = struct.Struct("<III")  # score, number of steps, seed
+# packed state, action code, reward (float32), packed next state
+STEP_RECORD = struct.Struct("<HBfH")
+# Action codes: the absolute actions, then the relative ones
+LOG_ACTIONS = list(ACTIONS) + list(RELATIVE_ACTIONS)
+LOG_ACTION_CODES = {action: code for code, action in enumerate(LOG_ACTIONS)}
+
+# path -> size of the log after this process last appended to it, so appends
+# only rescan a log that changed behind their back (e.g. cut short by a crash)
+_appended_size = {}
+
+
+def episode_log_path(agent_folder, agent_name, compress=False):
+    suffix = ".log.gz" if compress else ".log"
+    return os.path.join(agent_folder, f"{agent_name}_episodes{suffix}")
+
+
+def pack_episode(score, history, seed):
+    """Encode one game's ``(state, action, reward, next_state)`` history."""
+    parts = [EPISODE_HEADER.pack(score, len(history), seed)]
+    for state, action, reward, next_state in history:
+        parts.append(
+            STEP_RECORD.pack(
+                encode_state(state),
+                LOG_ACTION_CODES[action],
+                reward,
+                encode_state(next_state),
+            )
+        )
+    return b"".join(parts)
+
+
+def complete_size(path):
+    """How many bytes at the start of the log at ``path`` hold whole episodes.
+
+    A crash mid-append leaves a partial episode (or, in a gzip log, a partial
+    gzip member) at the end; this is where it starts. A file that isn't an
+    episode log raises ValueError.
+    """
+    if path.endswith(".gz"):
+        return _complete_gzip_size(path)
+    with open(path, "rb") as f:
+        magic = f.read(len(LOG_MAGIC))
+        if magic != LOG_MAGIC:
+            if LOG_MAGIC.startswith(magic):
+                return 0
+            raise ValueError(f"{path} is not an episode log")
+        end = f.seek(0, os.SEEK_END)
+        offset = len(LOG_MAGIC)
+        while offset + EPISODE_HEADER.size <= end:
+            f.seek(offset)
+            _, num_steps, _ = EPISODE_HEADER.unpack(f.read(EPISODE_HEADER.size))
+            episode_end = offset + EPISODE_HEADER.size + STEP_RECORD.size * num_steps
+            if episode_end > end:
+                break
+            offset = episode_end
+    return offset
+
+
+def _complete_gzip_size(path):
+    # Every append writes whole episodes as a gzip member of its own, so the
+    # log is whole up to the end of its last complete member
+    size = 0
+    with open(path, "rb") as f:
+        decompressor = zlib.decompressobj(wbits=31)
+        offset = 0
+        while True:
+            chunk = f.read(1 << 16)
+            if not chunk:
+                return size
+            offset += len(chunk)
+            while chunk:
+                try:
+                    decompressor.decompress(chunk)
+                except zlib.error:
+                    if size == 0:
+                        raise ValueError(f"{path} is not an episode log")
+                    return size
+                if not decompressor.eof:
+                    break
+                chunk = decompressor.unused_data
+                size = offset - len(chunk)
+                decompressor = zlib.decompressobj(wbits=31)
+
+
+def append_records(path, data):
+    """Append already packed episodes to the log at ``path``.
+
+    A partial episode left at the end by a crash is cut off first, so the new
+    episodes start where the last whole one ends. Gzip logs get a new gzip
+    member per call, which readers see as one continuous stream.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if size and _appended_size.get(path) != size:
+        complete = complete_size(path)
+        if complete < size:
+            os.truncate(path, complete)
+            size = complete
+    with opener(path, "ab") as f:
+        if size == 0:
+            f.write(LOG_MAGIC)
+        f.write(data)
+    _appended_size[path] = os.path.getsize(path)
+
+
+def append_episode(path, score, history, seed):
+    append_records(path, pack_episode(score, history, seed))
+
+
+def read_episodes(path, num_features=NUM_FEATURES):
+    """Yield ``(score, history, seed)`` for every complete episode in the log.
+
+    States are decoded into ``num_features`` booleans; pass the agent's
+    encoder's count if it isn't the default one. A record cut short by a
+    crash at the end of the file is ignored. A file that doesn't start with
+    LOG_MAGIC raises ValueError.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError(f"{path} is not an episode log")
+        while True:
+            try:
+                header = f.read(EPISODE_HEADER.size)
+                if len(header) < EPISODE_HEADER.size:
+                    return
+                score, num_steps, seed = EPISODE_HEADER.unpack(header)
+                body = f.read(STEP_RECORD.size * num_steps)
+            except EOFError:
+                return
+            if len(body) < STEP_RECORD.size * num_steps:
+                return
+            history = [
+                (
+                    decode_state(state, num_features),
+                    LOG_ACTIONS[action],
+                    reward,
+                    decode_state(next_state, num_features),
+                )
+                for state, action, reward, next_state in STEP_RECORD.iter_unpack(body)
+            ]
+            yield score, history, seed
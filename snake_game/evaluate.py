@@ -0,0 +1,257 @@
+# evaluate.py
+#
+# Judge an agent by its greedy policy over many headless games:
+#
+#     python snake_game/evaluate.py optimus --games 10000 --workers 8
+#
+# Game i is always played on the same episode seed (derived from --seed), so
+# two agents, or one agent before and after training, are compared on
+# exactly the same food sequences.
+
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import tempfile
+
+import numpy as np
+
+import rl_agent
+from q_table import QTable
+from directions import RELATIVE_ACTIONS
+from safety import safe_actions
+from snake_env import SnakeEnv, board_height, board_width
+from state_encoders import agent_encoder_id, get_encoder
+
+END_REASONS = ["wall", "self", "timeout", "won"]
+
+# z for a two-sided 95% confidence interval
+Z_95 = 1.96
+
+
+def game_seeds(games, seed=0):
+    seeds = random.Random(seed)
+    return [seeds.getrandbits(32) for _ in range(games)]
+
+
+def play_greedy(env, seed, max_idle_steps, safety_mask=False):
+    """Play one greedy game; returns ``(score, steps, end_reason)``.
+
+    States the Q-table has never seen get a random non-reversing move from a
+    stream seeded by the game, so every game is reproducible. A game that
+    goes ``max_idle_steps`` steps without eating ends as "timeout", since a
+    greedy policy can circle forever. With ``safety_mask``, moves that trap
+    the snake are masked out as in training.
+    """
+    state = env.reset(seed)
+    rng = random.Random(seed)
+    relative = rl_agent.Q_table.actions == RELATIVE_ACTIONS
+    idle = 0
+    while not env.done:
+        actions = rl_agent.valid_actions_for(env.heading, relative)
+        mask = safe_actions(env, actions) if safety_mask else None
+        action = rl_agent.Q_table.best_action(state, mask)
+        if action is None:
+            action = rng.choice(actions if mask is None else mask)
+        score = env.score
+        state, _, _ = env.step(action)
+        idle = 0 if env.score > score else idle + 1
+        if idle >= max_idle_steps and not env.done:
+            return env.score, env.steps, "timeout"
+    return env.score, env.steps, env.end_reason
+
+
+def _init_worker(snapshot_path, encoder_id, actions):
+    # Every worker maps the same snapshot file, so they share one copy of the
+    # table in the page cache instead of each unpickling its own
+    if snapshot_path is None:
+        rl_agent.Q_table = QTable(encoder_id, actions)
+    else:
+        rl_agent.Q_table = QTable.open_snapshot(snapshot_path, encoder_id, actions)
+
+
+def _play_games(args):
+    seeds, width, height, max_idle_steps, encoder_id, safety_mask = args
+    env = SnakeEnv(width=width, height=height, encoder=get_encoder(encoder_id))
+    return [play_greedy(env, seed, max_idle_steps, safety_mask) for seed in seeds]
+
+
+def describe(values):
+    """Mean with its 95% confidence interval, median, p95, min and max."""
+    values = np.asarray(values, dtype=float)
+    mean = float(values.mean())
+    std = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+    half_width = Z_95 * std / math.sqrt(len(values))
+    return {
+        "mean": mean,
+        "ci95": [mean - half_width, mean + half_width],
+        "median": float(np.median(values)),
+        "p95": float(np.percentile(values, 95)),
+        "min": float(values.min()),
+        "max": float(values.max()),
+    }
+
+
+def wilson_interval(count, total):
+    """95% Wilson score interval for the proportion ``count / total``."""
+    p = count / total
+    denominator = 1 + Z_95**2 / total
+    centre = (p + Z_95**2 / (2 * total)) / denominator
+    half_width = (
+        Z_95 * math.sqrt(p * (1 - p) / total + Z_95**2 / (4 * total**2)) / denominator
+    )
+    return [max(0.0, centre - half_width), min(1.0, centre + half_width)]
+
+
+def summarize(results):
+    """Statistics over ``(score, steps, end_reason)`` results, as a dict."""
+    scores, steps, reasons = zip(*results)
+    total = len(results)
+    end_reasons = {}
+    for reason in END_REASONS:
+        count = reasons.count(reason)
+        end_reasons[reason] = {
+            "count": count,
+            "fraction": count / total,
+            "ci95": wilson_interval(count, total),
+        }
+    return {
+        "games": total,
+        "score": describe(scores),
+        "steps": describe(steps),
+        "end_reasons": end_reasons,
+    }
+
+
+def evaluate(
+    agent_name,
+    games=10000,
+    workers=None,
+    seed=0,
+    width=board_width,
+    height=board_height,
+    max_idle_steps=None,
+):
+    """Play ``games`` greedy games with the agent and return ``summarize`` stats.
+
+    Games are spread over ``workers`` processes (all CPUs by default; 1 plays
+    them in this process). Nothing is written to the agent folder. The
+    Q-table is mapped read-only from the agent's snapshot, or, when a delta
+    log or an old pickle holds part of it, from a merged snapshot written to
+    a temporary directory for the run.
+    """
+    agent_data = rl_agent.load_agent(agent_name)
+    if not agent_data:
+        return None
+    encoder_id = agent_encoder_id(agent_data)
+    actions = rl_agent.agent_actions(agent_data)
+    max_idle_steps = max_idle_steps or width * height
+    seeds = game_seeds(games, seed)
+    workers = workers or multiprocessing.cpu_count()
+    # A few chunks per worker keeps them all busy when some games run long
+    chunk_size = max(1, math.ceil(games / (workers * 4)))
+    jobs = [
+        (
+            seeds[i : i + chunk_size],
+            width,
+            height,
+            max_idle_steps,
+            encoder_id,
+            agent_data.get("safety_mask", False),
+        )
+        for i in range(0, games, chunk_size)
+    ]
+
+    # A merged snapshot, if one is needed, lives as long as the games
+    with tempfile.TemporaryDirectory() as merged_folder:
+        snapshot_path = rl_agent.open_q_snapshot(
+            agent_name, merged_folder, encoder_id, actions
+        )
+        if workers == 1:
+            chunks = [_play_games(job) for job in jobs]
+        else:
+            with multiprocessing.Pool(
+                workers, _init_worker, (snapshot_path, encoder_id, actions)
+            ) as pool:
+                chunks = pool.map(_play_games, jobs)
+
+    report = summarize([result for chunk in chunks for result in chunk])
+    report.update(
+        agent=agent_name,
+        learning_cycles=agent_data["learning_cycles"],
+        seed=seed,
+        board=[width, height],
+    )
+    return report
+
+
+def format_report(report):
+    lines = [
+        f"{report['agent']} ({report['learning_cycles']} learning cycles): "
+        f"{report['games']} greedy games on a "
+        f"{report['board'][0]}x{report['board'][1]} board, seed {report['seed']}",
+    ]
+    for name in ("score", "steps"):
+        stats = report[name]
+        low, high = stats["ci95"]
+        lines.append(
+            f"{name:<6} mean {stats['mean']:.2f} (95% CI {low:.2f}-{high:.2f}), "
+            f"median {stats['median']:g}, p95 {stats['p95']:g}, "
+            f"min {stats['min']:g}, max {stats['max']:g}"
+        )
+    lines.append("end of game:")
+    for reason, stats in report["end_reasons"].items():
+        low, high = stats["ci95"]
+        lines.append(
+            f"  {reason:<8} {stats['count']:>7} {stats['fraction']:7.2%} "
+            f"(95% CI {low:.2%}-{high:.2%})"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluate an agent's greedy policy over many headless games."
+    )
+    parser.add_argument("agent_name", help="Name of an agent in the agents folder")
+    parser.add_argument("--games", type=int, default=10000, help="Number of games")
+    parser.add_argument(
+        "--workers", type=int, help="Number of worker processes (default: all CPUs)"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed the game seeds are derived from"
+    )
+    parser.add_argument(
+        "--width", type=int, default=board_width, help="Board width in cells"
+    )
+    parser.add_argument(
+        "--height", type=int, default=board_height, help="Board height in cells"
+    )
+    parser.add_argument(
+        "--max-idle-steps",
+        type=int,
+        help="End a game after this many steps without food (default: board area)",
+    )
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = evaluate(
+        args.agent_name,
+        args.games,
+        args.workers,
+        args.seed,
+        args.width,
+        args.height,
+        args.max_idle_steps,
+    )
+    if report is None:
+        raise SystemExit(1)
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
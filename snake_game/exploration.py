@@ -0,0 +1,106 @@
+# exploration.py
+#
+# Exploration rate (epsilon) schedules. An agent can declare one in its JSON
+# file:
+#
+#     "exploration_schedule": {"type": "cosine", "unit": "episode",
+#                              "start": 1.0, "end": 0.05, "duration": 5000}
+#
+# Its exploration rate is then a function of how far it has trained (in
+# episodes or steps), not of the value last saved, so two agents with the
+# same schedule explore the same way however long their games are. Agents
+# without a schedule keep the old per-step ``exploration_decay``.
+
+import math
+
+import numpy as np
+
+SCHEDULE_TYPES = ("constant", "linear", "exponential", "cosine", "step")
+UNITS = ("step", "episode")
+
+
+class ExplorationSchedule:
+    """Epsilon as a function of ``t``, the number of episodes or steps trained.
+
+    - constant: ``start``
+    - linear: ``start`` to ``end`` over ``duration``, then ``end``
+    - exponential: ``start * decay**t``, floored at ``end``
+    - cosine: ``start`` to ``end`` along half a cosine over ``duration``
+    - step: ``start * factor**(t // every)``, floored at ``end``
+
+    Calling the schedule gives one value; ``values`` takes an array of ``t``,
+    e.g. one per environment of a batch.
+    """
+
+    def __init__(
+        self,
+        type="exponential",
+        unit="episode",
+        start=1.0,
+        end=0.01,
+        decay=0.99,
+        duration=1000,
+        every=100,
+        factor=0.5,
+    ):
+        if type not in SCHEDULE_TYPES:
+            raise ValueError(f"Unknown exploration schedule type {type!r}")
+        if unit not in UNITS:
+            raise ValueError(f"Unknown exploration schedule unit {unit!r}")
+        if duration <= 0 or every <= 0:
+            raise ValueError("duration and every must be positive")
+        self.type = type
+        self.unit = unit
+        self.start = start
+        self.end = end
+        self.decay = decay
+        self.duration = duration
+        self.every = every
+        self.factor = factor
+
+    @classmethod
+    def from_config(cls, config):
+        try:
+            return cls(**config)
+        except TypeError as e:
+            raise ValueError(f"Bad exploration schedule {config!r}: {e}") from None
+
+    def to_config(self):
+        return dict(vars(self))
+
+    def __call__(self, t):
+        if self.type == "constant":
+            return self.start
+        if self.type == "linear":
+            progress = min(t / self.duration, 1.0)
+            return self.start + (self.end - self.start) * progress
+        if self.type == "exponential":
+            return max(self.end, self.start * self.decay**t)
+        if self.type == "cosine":
+            progress = min(t / self.duration, 1.0)
+            return self.end + (self.start - self.end) * 0.5 * (
+                1 + math.cos(math.pi * progress)
+            )
+        return max(self.end, self.start * self.factor ** (t // self.every))
+
+    def values(self, t):
+        t = np.asarray(t, dtype=float)
+        if self.type == "constant":
+            return np.full(t.shape, float(self.start))
+        if self.type == "linear":
+            progress = np.minimum(t / self.duration, 1.0)
+            return self.start + (self.end - self.start) * progress
+        if self.type == "exponential":
+            return np.maximum(self.end, self.start * self.decay**t)
+        if self.type == "cosine":
+            progress = np.minimum(t / self.duration, 1.0)
+            return self.end + (self.start - self.end) * 0.5 * (
+                1 + np.cos(np.pi * progress)
+            )
+        return np.maximum(self.end, self.start * self.factor ** (t // self.every))
+
+
+def agent_schedule(agent_data):
+    """The agent's declared schedule, or None for the legacy per-step decay."""
+    config = agent_data.get("exploration_schedule")
+    return ExplorationSchedule.from_config(config) if config else None
@@ -0,0 +1,51 @@
+# free_cells.py
+
+
+class FreeCells:
+    """The empty cells of the board, for drawing a random one in O(1).
+
+    Free cell ids are kept in a dense list, and ``index`` maps every cell to
+    its slot in that list (-1 when occupied). Occupying a cell moves the last
+    free cell into its slot and pops; releasing appends. Points are ``(x, y)``
+    grid cells, as used by SnakeEnv; points off the board are ignored.
+    """
+
+    def __init__(self, cols, rows):
+        self.cols = cols
+        self.rows = rows
+        self.cells = list(range(self.cols * self.rows))
+        self.index = list(range(self.cols * self.rows))
+
+    def __len__(self):
+        return len(self.cells)
+
+    def _cell(self, point):
+        x, y = point[0], point[1]
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return y * self.cols + x
+        return None
+
+    def occupy(self, point):
+        cell = self._cell(point)
+        if cell is None or self.index[cell] < 0:
+            return
+        slot = self.index[cell]
+        last = self.cells.pop()
+        if last != cell:
+            self.cells[slot] = last
+            self.index[last] = slot
+        self.index[cell] = -1
+
+    def release(self, point):
+        cell = self._cell(point)
+        if cell is None or self.index[cell] >= 0:
+            return
+        self.index[cell] = len(self.cells)
+        self.cells.append(cell)
+
+    def sample(self, rng):
+        """A uniformly random free cell as ``[x, y]``, or None if the board is full."""
+        if not self.cells:
+            return None
+        cell = self.cells[rng.randrange(len(self.cells))]
+        return [cell % self.cols, cell // self.cols]
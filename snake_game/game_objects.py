@@ -1,14 +1,13 @@
+import functools
 import pygame
 import random
+from snake_env import board_height, board_width
 
-# Initialize Pygame (only if not already initialized elsewhere)
-pygame.init()
-
-# Set up display variables
-screen_width = 640
-screen_height = 480
-screen = pygame.display.set_mode((screen_width, screen_height))
-pygame.display.set_caption("Snake Game")
+# The game logic works in grid cells; this is the only place they become
+# pixels. The window fits the default board at block_size pixels per cell
+block_size = 10
+screen_width = board_width * block_size
+screen_height = board_height * block_size
 
 # Colors
 black = (0, 0, 0)
@@ -16,31 +15,132 @@ white = (255, 255, 255)
 green = (0, 255, 0)
 red = (255, 0, 0)
 
+# The display and clock are created on first use rather than at import, so
+# importing this module never opens a window
+_screen = None
+_clock = None
+
+
+def get_screen():
+    global _screen
+    if _screen is None:
+        # Initialize Pygame (only if not already initialized elsewhere)
+        pygame.init()
+        _screen = pygame.display.set_mode((screen_width, screen_height))
+        pygame.display.set_caption("Snake Game")
+    return _screen
+
+
+def get_clock():
+    global _clock
+    if _clock is None:
+        _clock = pygame.time.Clock()
+    return _clock
+
+
+def __getattr__(name):
+    # Keeps ``from game_objects import screen, clock`` working lazily
+    if name == "screen":
+        return get_screen()
+    if name == "clock":
+        return get_clock()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Clock
-clock = pygame.time.Clock()
 
 # Snake variables
-snake_pos = [100, 50]
-snake_body = [[100, 50], [90, 50], [80, 50]]
+snake_pos = [10, 5]
+snake_body = [[10, 5], [9, 5], [8, 5]]
 snake_direction = "RIGHT"
 change_to = snake_direction
 
 # Food variables
-food_pos = [
-    random.randrange(1, (screen_width // 10)) * 10,
-    random.randrange(1, (screen_height // 10)) * 10,
-]
+food_pos = [random.randrange(board_width), random.randrange(board_height)]
 food_spawn = True
 
 # Score
 score = 0
 
 
-def draw_snake(snake_body):
-    for pos in snake_body:
-        pygame.draw.rect(screen, green, pygame.Rect(pos[0], pos[1], 10, 10))
+# Fonts are cached by (face, size), and rendered text by everything that
+# affects how it looks; rendering a string is far more expensive than
+# blitting the surface it produces
+_fonts = {}
+
+
+def get_font(size, face="freesansbold.ttf"):
+    font = _fonts.get((face, size))
+    if font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = _fonts[(face, size)] = pygame.font.Font(face, size)
+    return font
+
+
+@functools.lru_cache(maxsize=512)
+def render_text(text, size, color, background=None, face="freesansbold.ttf"):
+    return get_font(size, face).render(text, True, color, background)
+
+
+class BoardRenderer:
+    """Draws the game board, redrawing and updating only what changed.
+
+    Each ``draw`` erases the blocks the snake left, draws the blocks it
+    entered, repaints the food and the text overlays, and passes just those
+    rects to ``pygame.display.update``. The whole screen is redrawn on the
+    first frame and whenever an overlay's text changes (e.g. the score).
+
+    Positions are grid cells on a ``width`` x ``height`` board, scaled to
+    the largest whole number of pixels per cell that fits the window.
+    """
+
+    def __init__(self, width=board_width, height=board_height, text_size=24):
+        self.cell_size = max(1, min(screen_width // width, screen_height // height))
+        self.text_size = text_size
+        self.blocks = set()
+        self.food = None
+        self.texts = None
+
+    def _block_rect(self, pos):
+        size = self.cell_size
+        return pygame.Rect(pos[0] * size, pos[1] * size, size, size)
+
+    def draw(self, snake_body, food_pos, texts=()):
+        """``texts`` is a sequence of ``(text, (x, y))`` overlays."""
+        screen = get_screen()
+        blocks = {(pos[0], pos[1]) for pos in snake_body}
+        food = (food_pos[0], food_pos[1])
+        texts = list(texts)
+
+        if texts != self.texts:
+            screen.fill(black)
+            for pos in blocks:
+                pygame.draw.rect(screen, green, self._block_rect(pos))
+            dirty = None
+        else:
+            dirty = []
+            for pos in self.blocks - blocks:
+                dirty.append(pygame.draw.rect(screen, black, self._block_rect(pos)))
+            for pos in blocks - self.blocks:
+                dirty.append(pygame.draw.rect(screen, green, self._block_rect(pos)))
+            if self.food is not None and self.food != food:
+                color = green if self.food in blocks else black
+                dirty.append(
+                    pygame.draw.rect(screen, color, self._block_rect(self.food))
+                )
+
+        # Food and overlays are cheap to repaint and must stay on top
+        food_rect = pygame.draw.rect(screen, white, self._block_rect(food))
+        text_rects = [
+            screen.blit(render_text(text, self.text_size, white, black), pos)
+            for text, pos in texts
+        ]
+
+        if dirty is None:
+            pygame.display.update()
+        else:
+            pygame.display.update(dirty + [food_rect] + text_rects)
 
+        self.blocks = blocks
+        self.food = food
+        self.texts = texts
 
-def draw_food(food_pos):
-    pygame.draw.rect(screen, white, pygame.Rect(food_pos[0], food_pos[1], 10, 10))
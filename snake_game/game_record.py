@@ -0,0 +1,131 @@
+# game_record.py
+#
+# A game of snake is fully determined by its episode seed and the actions
+# taken, so that is all a record stores:
+#
+#     {"seed": 1234567, "actions": "RRRDDL...", "score": 3}
+#
+# with one letter per step (the first letter of the action; "s", "l" and "r"
+# for agents acting relative to their heading), plus "width" and
+# "height" for games not played on the default board. Records can be
+# replayed headless at full speed, e.g. to check a regression, or watched in
+# the pygame window at any frame rate:
+#
+#     python snake_game/game_record.py agents/optimus_episodes.log --episode 12
+#     python snake_game/game_record.py agents/optimus_episodes.log --headless
+#     python snake_game/game_record.py agents/tiny_episodes.log --width 10 --height 10
+
+import argparse
+
+from directions import RELATIVE_ACTIONS
+from episode_log import read_episodes
+from snake_env import ACTIONS, SnakeEnv, board_height, board_width
+
+ACTION_LETTERS = {action: action[0] for action in ACTIONS}
+ACTION_LETTERS.update(zip(RELATIVE_ACTIONS, "slr"))
+LETTER_ACTIONS = {letter: action for action, letter in ACTION_LETTERS.items()}
+
+
+def make_record(seed, actions, score=None, width=board_width, height=board_height):
+    record = {"seed": seed, "actions": "".join(ACTION_LETTERS[a] for a in actions)}
+    if score is not None:
+        record["score"] = score
+    if (width, height) != (board_width, board_height):
+        record["width"] = width
+        record["height"] = height
+    return record
+
+
+def record_actions(record):
+    return [LETTER_ACTIONS[letter] for letter in record["actions"]]
+
+
+def records_from_log(path, width=board_width, height=board_height):
+    """Yield a record for every episode in an episode log.
+
+    The log doesn't store the board size, so pass the one it was trained on.
+    """
+    for score, history, seed in read_episodes(path):
+        actions = [step[1] for step in history]
+        yield make_record(seed, actions, score, width, height)
+
+
+def replay_game(record, on_step=None):
+    """Replay ``record`` in a fresh SnakeEnv and return the env at the end.
+
+    ``on_step`` is called with the env after every step, as in
+    ``rl_agent.play_episode``.
+    """
+    env = SnakeEnv(
+        width=record.get("width", board_width),
+        height=record.get("height", board_height),
+    )
+    env.reset(record["seed"])
+    for action in record_actions(record):
+        env.step(action)
+        if on_step is not None:
+            on_step(env)
+        if env.done:
+            break
+    return env
+
+
+def watch_game(record, fps=10):
+    """Replay ``record`` in the pygame window at ``fps`` frames per second."""
+    import pygame
+    from game_objects import BoardRenderer, clock
+
+    renderer = BoardRenderer(
+        record.get("width", board_width), record.get("height", board_height)
+    )
+
+    def render(env):
+        renderer.draw(env.snake_body, env.food_pos, [(f"Score: {env.score}", (10, 10))])
+        # Keep the window responsive while the replay runs
+        pygame.event.pump()
+        clock.tick(fps)
+
+    return replay_game(record, on_step=render)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay games from an episode log.")
+    parser.add_argument("log", help="Path to an agent's episode log")
+    parser.add_argument(
+        "--episode", type=int, help="Index of the game to replay (default: all)"
+    )
+    parser.add_argument("--fps", type=int, default=10, help="Frame rate when watching")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Replay at full speed without a window and check the scores",
+    )
+    parser.add_argument(
+        "--width",
+        type=int,
+        default=board_width,
+        help="Board width the log was played on",
+    )
+    parser.add_argument(
+        "--height",
+        type=int,
+        default=board_height,
+        help="Board height the log was played on",
+    )
+    args = parser.parse_args()
+
+    mismatches = 0
+    records = records_from_log(args.log, args.width, args.height)
+    for i, record in enumerate(records):
+        if args.episode is not None and i != args.episode:
+            continue
+        env = replay_game(record) if args.headless else watch_game(record, args.fps)
+        status = "ok" if env.score == record["score"] else "MISMATCH"
+        mismatches += status != "ok"
+        print(f"episode {i}: score {env.score}, {env.steps} steps, {status}")
+    if mismatches:
+        raise SystemExit(f"{mismatches} replays did not match the log")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,70 @@
+import heapq
 import json
 
+from file_utils import atomic_write_json, file_lock
+
 HIGH_SCORES_FILE = "high_scores.json"
 
+# Number of entries kept on a leaderboard
+TOP_K = 5
+
 
-def read_high_scores():
+def read_high_scores(path=HIGH_SCORES_FILE):
     try:
-        with open(HIGH_SCORES_FILE, "r") as f:
+        with open(path, "r") as f:
             return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
         return []
 
 
-def update_high_scores(score, name):
-    high_scores = read_high_scores()
-    high_scores.append({"name": name, "score": score})
-    # Keep only the top 5 scores
-    high_scores = sorted(high_scores, key=lambda x: x["score"], reverse=True)[:5]
-    with open(HIGH_SCORES_FILE, "w") as f:
-        json.dump(high_scores, f)
+class HighScoreStore:
+    """A top-``k`` leaderboard file that is updated in batches.
+
+    ``add`` only records a score in memory, in a min-heap of at most ``k``
+    entries, since nothing below the k-th best of a batch can reach the
+    board. ``flush`` merges the batch into the file while holding a lock and
+    replaces the file atomically, so trainers in several processes can share
+    a leaderboard without losing each other's scores. On equal scores the
+    earlier entry ranks first.
+    """
+
+    def __init__(self, path=HIGH_SCORES_FILE, k=TOP_K):
+        self.path = path
+        self.k = k
+        self._pending = []
+        self._added = 0
+
+    def add(self, score, name):
+        self._added += 1
+        # Later entries compare lower, so they lose ties
+        entry = (score, -self._added, name)
+        if len(self._pending) < self.k:
+            heapq.heappush(self._pending, entry)
+        elif entry > self._pending[0]:
+            heapq.heapreplace(self._pending, entry)
+
+    def _pending_entries(self):
+        return [
+            {"name": name, "score": score}
+            for score, _, name in sorted(self._pending, reverse=True)
+        ]
+
+    def read(self):
+        """The leaderboard as it will be after the next flush."""
+        entries = read_high_scores(self.path) + self._pending_entries()
+        return heapq.nlargest(self.k, entries, key=lambda entry: entry["score"])
+
+    def flush(self):
+        if not self._pending:
+            return
+        with file_lock(self.path + ".lock"):
+            high_scores = self.read()
+            atomic_write_json(self.path, high_scores)
+        self._pending = []
+
+
+def update_high_scores(score, name, path=HIGH_SCORES_FILE, k=TOP_K):
+    """Record a single score straight away."""
+    store = HighScoreStore(path, k)
+    store.add(score, name)
+    store.flush()
@@ -0,0 +1,52 @@
+# loop_detector.py
+#
+# Loop penalties from fixed-size windows over recent steps, so they don't
+# need the game's full history.
+
+from collections import deque
+
+from snake_body import cell_key
+
+
+class WindowCounter:
+    """How often each key occurs among the last ``size`` keys pushed.
+
+    A ring of the keys in the window plus a count per key, so both ``count``
+    and ``push`` are O(1) whatever the window size.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._window = deque()
+        self._counts = {}
+
+    def __len__(self):
+        return len(self._window)
+
+    def count(self, key):
+        return self._counts.get(key, 0)
+
+    def push(self, key):
+        if len(self._window) == self.size:
+            old = self._window.popleft()
+            remaining = self._counts[old] - 1
+            if remaining:
+                self._counts[old] = remaining
+            else:
+                del self._counts[old]
+        self._window.append(key)
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def clear(self):
+        self._window.clear()
+        self._counts.clear()
+
+
+def position_key(snake_body):
+    """A 64-bit hash of the board position: the covered cells and the head.
+
+    The head's key is rotated so the same cells with a different head hash
+    differently.
+    """
+    head = cell_key(snake_body.head)
+    return snake_body.key ^ ((head << 1 | head >> 63) & 0xFFFFFFFFFFFFFFFF)
@@ -0,0 +1,234 @@
+# parallel_train.py
+#
+# Multi-process Q-learning. Every worker plays episodes against its own copy
+# of the Q-table and reports back what it changed; the coordinator merges the
+# reports into the shared table and hands the result out for the next round.
+
+import multiprocessing
+import random
+import time
+
+import numpy as np
+
+import rl_agent
+from episode_log import append_records, pack_episode
+from exploration import agent_schedule
+from q_table import ACTION_INDEX, QTable, encode_state
+from snake_env import SnakeEnv, board_height, board_width
+from state_encoders import agent_encoder_id, get_encoder
+
+# The worker process's replay buffer. Pool processes live for the whole
+# session, so it keeps the experience of earlier rounds, as the single
+# process buffer of ``rl_agent.train`` does
+_replay = None
+
+
+def _worker_round(args):
+    """Play ``episodes`` games from the round's Q-table; return the changes.
+
+    Returns ``(deltas, visits, summaries, records, exploration_rate)`` where
+    ``deltas`` is ``local.values - base.values`` and ``visits`` counts how many
+    updates this worker made to each (state, action) pair, both shaped like
+    the table (2**n states of the agent's encoder by its k actions),
+    ``summaries`` holds ``(score, steps, exploration_rate, duration, seed)``
+    per game and ``records`` the games packed for the episode log. With the
+    agent's replay settings on, the worker also replays minibatches from its
+    own buffer, as ``rl_agent.train`` does.
+
+    The ``offset``-th of ``stride`` workers plays every ``stride``-th game of
+    the round, so an exploration schedule sees the episode (and roughly the
+    step) counts the games would have had in a single process.
+    """
+    global _replay
+    (
+        snapshot_path,
+        delta_path,
+        agent_data,
+        episodes,
+        seed,
+        width,
+        height,
+        offset,
+        stride,
+    ) = args
+    # Read the round's table from the agent's snapshot and delta log rather
+    # than unpickling one sent with every job
+    encoder_id = agent_encoder_id(agent_data)
+    base_table = QTable.open_snapshot(
+        snapshot_path, encoder_id, rl_agent.agent_actions(agent_data)
+    ).copy()
+    base_table.apply_deltas(delta_path)
+    rl_agent.Q_table = base_table.copy()
+
+    # Each job gets its own seed, so workers never share a random stream
+    seeds = random.Random(seed)
+    env = SnakeEnv(seeds.getrandbits(64), width, height, get_encoder(encoder_id))
+    rng = random.Random(seeds.getrandbits(64))
+    replay_seed = seeds.getrandbits(64)
+    if _replay is None:
+        _replay = rl_agent.make_replay_buffer(agent_data, replay_seed)
+    visits = np.zeros(base_table.values.shape, dtype=np.int64)
+    summaries = []
+    records = []
+    first_episode = agent_data["learning_cycles"] + offset
+    first_step = agent_data.get("steps_trained", 0)
+    played_steps = 0
+    for i in range(episodes):
+        agent_data["learning_cycles"] = first_episode + i * stride
+        agent_data["steps_trained"] = first_step + played_steps * stride + offset
+        start = time.monotonic()
+        score = rl_agent.play_episode(
+            env, agent_data, "learning", replay=_replay, rng=rng
+        )
+        duration = time.monotonic() - start
+        played_steps += env.steps
+        for state, action, _, _ in agent_data["history"]:
+            visits[encode_state(state), ACTION_INDEX[action]] += 1
+        summaries.append(
+            (
+                score,
+                env.steps,
+                agent_data["exploration_rate"],
+                duration,
+                env.episode_seed,
+            )
+        )
+        records.append(pack_episode(score, agent_data["history"], env.episode_seed))
+
+    deltas = rl_agent.Q_table.values - base_table.values
+    # Replayed minibatches also update pairs this round's games didn't visit;
+    # count those as one update each so the merge keeps them
+    visits[(deltas != 0) & (visits == 0)] = 1
+    return deltas, visits, summaries, b"".join(records), agent_data["exploration_rate"]
+
+
+def merge_q_deltas(q_table, results):
+    """Merge worker deltas into ``q_table`` with a visit-weighted average.
+
+    For every (state, action) pair the new value is
+    ``base + sum(n_w * delta_w) / sum(n_w)`` over the workers that visited
+    it, so a worker that saw a state more often has more say in its value.
+    """
+    weighted = np.zeros(q_table.values.shape)
+    totals = np.zeros(q_table.values.shape, dtype=np.int64)
+    for deltas, visits in results:
+        weighted += visits * deltas
+        totals += visits
+
+    visited = totals > 0
+    q_table.values[visited] += weighted[visited] / totals[visited]
+    q_table.visited |= visited
+    q_table.dirty |= visited.any(axis=1)
+    return q_table
+
+
+def parallel_train(
+    agent_name,
+    episodes,
+    workers=None,
+    sync_every=50,
+    seed=None,
+    width=board_width,
+    height=board_height,
+):
+    """Train an agent with ``workers`` processes, merging every ``sync_every`` games.
+
+    The agent JSON and Q-table are written in the same format as
+    ``rl_agent.train``, once per merge round, and every game is appended to
+    the agent's episode log.
+    """
+    agent_data = rl_agent.load_agent(agent_name)
+    if not agent_data:
+        return None
+    rl_agent.load_q_table(
+        agent_name, agent_encoder_id(agent_data), rl_agent.agent_actions(agent_data)
+    )
+    q_table = rl_agent.Q_table
+
+    workers = workers or multiprocessing.cpu_count()
+    seeds = random.Random(seed)
+    log_path = rl_agent.agent_episode_log(agent_name)
+    snapshot_path = rl_agent.q_snapshot_path(agent_name)
+    delta_path = rl_agent.q_delta_path(agent_name)
+    high_scores = rl_agent.agent_high_score_stores(agent_data)
+    db = rl_agent.open_agent_db()
+    schedule = agent_schedule(agent_data)
+    all_scores = []
+
+    # Workers read the table from the agent's files, so start from a snapshot
+    # of it; every merge is then checkpointed like a training session's, as a
+    # delta on top of it unless the log has outgrown the snapshot
+    rl_agent.save_q_table(agent_name, full=True)
+    with multiprocessing.Pool(workers) as pool:
+        remaining = episodes
+        while remaining > 0:
+            # Split this round's games as evenly as possible across workers
+            round_episodes = min(remaining, workers * sync_every)
+            shares = [round_episodes // workers] * workers
+            for i in range(round_episodes % workers):
+                shares[i] += 1
+            worker_agent = {**agent_data, "history": []}
+            shares = [n for n in shares if n]
+            jobs = [
+                (
+                    snapshot_path,
+                    delta_path,
+                    worker_agent,
+                    n,
+                    seeds.getrandbits(64),
+                    width,
+                    height,
+                    offset,
+                    len(shares),
+                )
+                for offset, n in enumerate(shares)
+            ]
+
+            results = pool.map(_worker_round, jobs)
+            merge_q_deltas(q_table, [(result[0], result[1]) for result in results])
+
+            summaries = [summary for result in results for summary in result[2]]
+            scores = [summary[0] for summary in summaries]
+            append_records(log_path, b"".join(result[3] for result in results))
+            first_episode = agent_data["learning_cycles"] + 1
+            agent_data["learning_cycles"] += round_episodes
+            if schedule is None:
+                agent_data["exploration_rate"] = sum(
+                    result[4] for result in results
+                ) / len(results)
+            else:
+                agent_data["steps_trained"] = agent_data.get("steps_trained", 0) + sum(
+                    summary[1] for summary in summaries
+                )
+                clock = agent_data["learning_cycles"]
+                if schedule.unit == "step":
+                    clock = agent_data["steps_trained"]
+                agent_data["exploration_rate"] = schedule(clock)
+
+            rl_agent.Q_table = q_table
+            rl_agent.save_agent(agent_data)
+            rl_agent.save_q_table(agent_name)
+            if db is not None:
+                db.save_agent(agent_data)
+                db.add_episodes(
+                    agent_name,
+                    [
+                        (first_episode + i, *summary)
+                        for i, summary in enumerate(summaries)
+                    ],
+                )
+
+            name = rl_agent.leaderboard_name(agent_data)
+            for store in high_scores:
+                for score in scores:
+                    store.add(score, name)
+                store.flush()
+
+            all_scores.extend(scores)
+            remaining -= round_episodes
+
+    if db is not None:
+        db.save_q_snapshot(agent_name, q_table, agent_data["learning_cycles"])
+        db.close()
+    print("Learning session completed!")
+    return all_scores
@@ -0,0 +1,102 @@
+# profiler.py
+#
+# Optional timing of the training loop. Set rl_agent.PROFILER to a Profiler
+# (train.py --profile does this) and the loop records how long each phase of
+# a step and each piece of per-episode I/O takes, plus steps and episodes per
+# second. With PROFILER left as None the loop only pays one ``if`` per phase.
+
+import collections
+import json
+import time
+
+
+class Profiler:
+    """Wall time per named phase, and throughput counters.
+
+    Instrumented code reads ``time.perf_counter()`` when a phase begins and
+    calls ``lap(phase, start)`` when it ends; ``lap`` adds the elapsed time
+    to the phase and returns the current reading, so back-to-back phases
+    chain without extra clock reads.
+
+    ``episode_done`` feeds the counters. The rolling rates cover roughly the
+    last ``window`` seconds.
+    """
+
+    def __init__(self, window=10.0):
+        self.window = window
+        self.totals = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+        self.steps = 0
+        self.episodes = 0
+        self.started = time.perf_counter()
+        # (time, steps, episodes) at recent episode ends; the first entry is
+        # the newest one at least ``window`` seconds old
+        self._marks = collections.deque([(self.started, 0, 0)])
+
+    def lap(self, phase, start):
+        now = time.perf_counter()
+        self.totals[phase] += now - start
+        self.calls[phase] += 1
+        return now
+
+    def episode_done(self, steps):
+        self.steps += steps
+        self.episodes += 1
+        now = time.perf_counter()
+        self._marks.append((now, self.steps, self.episodes))
+        while len(self._marks) > 2 and now - self._marks[1][0] >= self.window:
+            self._marks.popleft()
+
+    def rolling_rates(self):
+        """``(steps/s, episodes/s)`` over the recent window."""
+        (start, steps, episodes), (end, last_steps, last_episodes) = (
+            self._marks[0],
+            self._marks[-1],
+        )
+        elapsed = end - start
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (last_steps - steps) / elapsed, (last_episodes - episodes) / elapsed
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        rolling_steps, rolling_episodes = self.rolling_rates()
+        phases = {}
+        for phase in sorted(self.totals, key=self.totals.get, reverse=True):
+            total = self.totals[phase]
+            phases[phase] = {
+                "total_s": total,
+                "calls": self.calls[phase],
+                "mean_us": total / self.calls[phase] * 1e6,
+                "share": total / elapsed if elapsed else 0.0,
+            }
+        return {
+            "elapsed_s": elapsed,
+            "steps": self.steps,
+            "episodes": self.episodes,
+            "steps_per_s": self.steps / elapsed if elapsed else 0.0,
+            "episodes_per_s": self.episodes / elapsed if elapsed else 0.0,
+            "rolling_window_s": self.window,
+            "rolling_steps_per_s": rolling_steps,
+            "rolling_episodes_per_s": rolling_episodes,
+            "phases": phases,
+        }
+
+    def dump_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def format_report(self):
+        report = self.report()
+        lines = [
+            f"{report['steps']} steps, {report['episodes']} episodes in "
+            f"{report['elapsed_s']:.1f}s: {report['steps_per_s']:.0f} steps/s, "
+            f"{report['episodes_per_s']:.2f} episodes/s "
+            f"(last {self.window:g}s: {report['rolling_steps_per_s']:.0f} steps/s)",
+        ]
+        for phase, stats in report["phases"].items():
+            lines.append(
+                f"  {phase:<18} {stats['total_s']:9.3f}s {stats['share']:7.1%} "
+                f"{stats['calls']:>10} calls {stats['mean_us']:10.2f} us/call"
+            )
+        return "\n".join(lines)
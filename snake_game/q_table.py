@@ -0,0 +1,528 @@
+# q_table.py
+
+import os
+import pickle
+import struct
+import zlib
+
+import numpy as np
+
+from file_utils import atomic_write_bytes
+from directions import RELATIVE_ACTIONS
+from snake_env import ACTIONS
+from state_encoders import DEFAULT_ENCODER, get_encoder
+
+# Features of the default (basic) encoder's states
+NUM_FEATURES = 11
+NUM_STATES = 2**NUM_FEATURES
+# Column of each action in a Q-table of absolute or of relative actions
+ACTION_INDEX = {
+    **{action: i for i, action in enumerate(ACTIONS)},
+    **{action: i for i, action in enumerate(RELATIVE_ACTIONS)},
+}
+# Action set id (an agent's "action_mode") -> the action set
+ACTION_SET_IDS = {"absolute": tuple(ACTIONS), "relative": RELATIVE_ACTIONS}
+
+# Bit weights for packing a row of boolean features into an int
+_BITS = 1 << np.arange(NUM_FEATURES)
+
+# Binary snapshots: a fixed-size header (magic, format version, number of
+# states and actions, dtype of the values, state encoder id, action set id,
+# generation, size of the pickled ``extra`` entries, CRC-32) padded to
+# SNAPSHOT_HEADER_SIZE bytes, then the values array and the visited mask (one
+# byte per pair), both C-ordered, then the pickled ``extra``. The fixed layout
+# lets readers mmap the arrays in place. The CRC covers the whole file, with
+# the CRC field itself zeroed.
+SNAPSHOT_MAGIC = b"SNAKEQT\x00"
+SNAPSHOT_VERSION = 3
+SNAPSHOT_HEADER = struct.Struct("<8sIII8s16s16sQQI")
+SNAPSHOT_HEADER_SIZE = 128
+SNAPSHOT_DTYPE = np.dtype("<f8")
+
+# Delta logs: the states updated between two full snapshots, appended to a
+# file one record per save. A record is a header (magic, generation of the
+# snapshot it applies to, sequence number, number of states, CRC-32 of the
+# record with the CRC field zeroed), then the states' codes as uint32, their
+# rows of values and their rows of the visited mask.
+DELTA_MAGIC = b"SNAKEQD\x00"
+DELTA_HEADER = struct.Struct("<8sQIII")
+
+
+def decode_state(code, num_features=NUM_FEATURES):
+    return tuple(bool(code >> i & 1) for i in range(num_features))
+
+
+# State tuples mapped to their packed codes; a dict lookup is much cheaper
+# per step than packing the bits in Python. Every basic state is there from
+# the start, other encoders' states are added as they're first seen
+_CODES = {decode_state(code): code for code in range(NUM_STATES)}
+
+
+def encode_state(state):
+    """Pack a tuple of booleans from a state encoder into an int."""
+    state = tuple(state)
+    code = _CODES.get(state)
+    if code is None:
+        code = _CODES[state] = sum(1 << i for i, feature in enumerate(state) if feature)
+    return code
+
+
+def encode_states(states):
+    """Vectorized ``encode_state`` for an (N, 11) boolean array."""
+    return np.asarray(states, dtype=np.int64) @ _BITS
+
+
+def is_encodable(state, num_features=NUM_FEATURES):
+    return (
+        isinstance(state, tuple)
+        and len(state) == num_features
+        and all(isinstance(feature, bool) for feature in state)
+    )
+
+
+def _ascii(field):
+    return field.rstrip(b"\x00").decode("ascii")
+
+
+def read_snapshot_header(path):
+    """The header of the snapshot at ``path`` as a dict, or None if it's missing.
+
+    Raises ValueError if the file isn't a snapshot this version can read.
+    """
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(SNAPSHOT_HEADER_SIZE)
+    except FileNotFoundError:
+        return None
+    if raw[:8] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a Q-table snapshot")
+    if len(raw) < SNAPSHOT_HEADER_SIZE:
+        raise ValueError(f"{path}: truncated snapshot header")
+    (
+        _,
+        version,
+        num_states,
+        num_actions,
+        dtype,
+        encoder,
+        action_set,
+        generation,
+        extra_size,
+        crc,
+    ) = SNAPSHOT_HEADER.unpack_from(raw)
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"{path}: unsupported snapshot version {version}")
+    return {
+        "num_states": num_states,
+        "num_actions": num_actions,
+        "dtype": np.dtype(_ascii(dtype)),
+        "encoder": _ascii(encoder),
+        "actions": ACTION_SET_IDS.get(_ascii(action_set)),
+        "generation": generation,
+        "extra_size": extra_size,
+        "crc": crc,
+        # The header as the CRC saw it
+        "raw": raw[: SNAPSHOT_HEADER.size - 4] + bytes(4) + raw[SNAPSHOT_HEADER.size :],
+    }
+
+
+def load_saved_table(snapshot_path, delta_path, pickle_path=None):
+    """The table saved at ``snapshot_path`` plus its delta log, or None.
+
+    Tables saved before binary snapshots were kept in a pickle, which is read
+    if there's no snapshot yet. Every file is checked, and a corrupt one
+    raises ValueError rather than losing the table.
+    """
+    if os.path.exists(snapshot_path):
+        return QTable.load_snapshot(snapshot_path, delta_path)
+    if pickle_path is not None and os.path.exists(pickle_path):
+        return QTable.load(pickle_path)
+    return None
+
+
+class QTable:
+    """Q-values for every packed state and action in a (2**n, k) float array.
+
+    ``n`` is the number of features of the table's state ``encoder`` (an id
+    from state_encoders.py), 11 for the default one. The ``k`` columns are
+    ``actions``: the 4 absolute ones by default, or the 3 relative ones
+    (see directions.py).
+
+    ``visited`` marks the (state, action) pairs that have been updated, which
+    is what the old dict-of-dicts table expressed by the presence of a key: a
+    state with no visited actions has no greedy action, and its max Q is 0.
+
+    Entries from a pickle whose state isn't a tuple of ``n`` booleans (older
+    state formats) can't be packed; they're kept in ``extra`` untouched so
+    that saving writes them back out.
+
+    ``dirty`` marks the states updated since the table was last saved, which
+    is all ``save_delta`` writes. ``generation`` identifies the snapshot the
+    table was last saved as or loaded from (None if neither), which is the
+    one its deltas apply to. ``delta_log_size`` is how many bytes of its
+    delta log hold complete records for it (None if unknown).
+    """
+
+    def __init__(self, encoder=DEFAULT_ENCODER, actions=ACTIONS):
+        self.encoder = encoder
+        self.actions = tuple(actions)
+        self.num_features = get_encoder(encoder).num_features
+        shape = (2**self.num_features, len(self.actions))
+        self.values = np.zeros(shape)
+        self.visited = np.zeros(shape, dtype=bool)
+        self.extra = {}
+        self.dirty = np.zeros(len(self.values), dtype=bool)
+        self.generation = None
+        self.delta_sequence = 0
+        self.delta_log_size = None
+
+    def copy(self):
+        table = QTable(self.encoder, self.actions)
+        table.values[:] = self.values
+        table.visited[:] = self.visited
+        table.extra = dict(self.extra)
+        table.dirty[:] = self.dirty
+        table.generation = self.generation
+        table.delta_sequence = self.delta_sequence
+        table.delta_log_size = self.delta_log_size
+        return table
+
+    def __len__(self):
+        return int(self.visited.any(axis=1).sum()) + len(self.extra)
+
+    def get(self, state, action):
+        return float(self.values[encode_state(state), ACTION_INDEX[action]])
+
+    def set(self, state, action, value):
+        code, index = encode_state(state), ACTION_INDEX[action]
+        self.values[code, index] = value
+        self.visited[code, index] = True
+        self.dirty[code] = True
+
+    def _visited_values(self, state):
+        # Plain Python lists are much faster than NumPy for a 4-element row
+        code = encode_state(state)
+        values = self.values[code].tolist()
+        visited = self.visited[code].tolist()
+        return [(values[i], i) for i in range(len(values)) if visited[i]]
+
+    def best_action(self, state, actions=None):
+        """The greedy action for ``state``, or None if it was never visited.
+
+        With ``actions`` given, only those are considered.
+        """
+        candidates = self._visited_values(state)
+        if actions is not None:
+            candidates = [c for c in candidates if self.actions[c[1]] in actions]
+        if not candidates:
+            return None
+        return self.actions[max(candidates, key=lambda c: c[0])[1]]
+
+    def max_q(self, state):
+        candidates = self._visited_values(state)
+        return max(candidates)[0] if candidates else 0
+
+    def argmax(self, codes):
+        """Greedy action index per packed state, and whether it had any visits."""
+        visited = self.visited[codes]
+        values = np.where(visited, self.values[codes], -np.inf)
+        return values.argmax(axis=1), visited.any(axis=1)
+
+    def max_q_batch(self, codes):
+        visited = self.visited[codes]
+        values = np.where(visited, self.values[codes], -np.inf)
+        return np.where(visited.any(axis=1), values.max(axis=1), 0.0)
+
+    def update(self, codes, actions, targets, learning_rate, weights=None):
+        """Move Q(codes, actions) towards ``targets`` by ``learning_rate``.
+
+        Pairs that appear more than once in a batch move towards the mean of
+        their targets, so a batch never overshoots a single update. Optional
+        per-sample ``weights`` scale each error (importance sampling).
+        """
+        flat = codes * len(self.actions) + actions
+        errors = targets - self.values.reshape(-1)[flat]
+        if weights is not None:
+            errors = errors * weights
+        size = self.values.size
+        sums = np.bincount(flat, weights=errors, minlength=size)
+        counts = np.bincount(flat, minlength=size)
+        hit = counts > 0
+        self.values.reshape(-1)[hit] += learning_rate * sums[hit] / counts[hit]
+        self.visited.reshape(-1)[hit] = True
+        self.dirty[codes] = True
+
+    @classmethod
+    def from_dict(cls, q_dict, encoder=DEFAULT_ENCODER, actions=ACTIONS):
+        table = cls(encoder, actions)
+        for state, state_actions in q_dict.items():
+            if not is_encodable(state, table.num_features):
+                table.extra[state] = state_actions
+                continue
+            code = encode_state(state)
+            for action, value in state_actions.items():
+                table.values[code, ACTION_INDEX[action]] = value
+                table.visited[code, ACTION_INDEX[action]] = True
+        return table
+
+    def to_dict(self):
+        q_dict = dict(self.extra)
+        for code in np.flatnonzero(self.visited.any(axis=1)):
+            q_dict[decode_state(int(code), self.num_features)] = {
+                self.actions[i]: float(self.values[code, i])
+                for i in np.flatnonzero(self.visited[code])
+            }
+        return q_dict
+
+    @classmethod
+    def from_bytes(cls, data):
+        q_dict = pickle.loads(data)
+        encoder, actions = DEFAULT_ENCODER, ACTIONS
+        if "state_encoder" in q_dict:
+            encoder, actions = q_dict["state_encoder"], q_dict.get("actions", actions)
+            q_dict = q_dict["q_table"]
+        return cls.from_dict(q_dict, encoder, actions)
+
+    def to_bytes(self):
+        """The table as a dict-of-dicts pickle, as the agents database keeps it.
+
+        Tables with another encoder or action set than the default are
+        wrapped as ``{"state_encoder": id, "actions": [...], "q_table":
+        dict}``; default ones keep the plain dict older versions read.
+        """
+        if self.encoder == DEFAULT_ENCODER and self.actions == tuple(ACTIONS):
+            return pickle.dumps(self.to_dict())
+        return pickle.dumps(
+            {
+                "state_encoder": self.encoder,
+                "actions": list(self.actions),
+                "q_table": self.to_dict(),
+            }
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load a table from a dict-of-dicts pickle, as agents used to be saved."""
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            return cls.from_bytes(data)
+        except Exception as e:
+            raise ValueError(f"{path}: corrupt Q-table pickle ({e!r})") from e
+
+    def save(self, path):
+        atomic_write_bytes(path, self.to_bytes())
+
+    def action_set_id(self):
+        for action_set_id, actions in ACTION_SET_IDS.items():
+            if actions == self.actions:
+                return action_set_id
+        raise ValueError(f"No action set id for {self.actions}")
+
+    def snapshot_size(self):
+        """Bytes of a full snapshot of the table, without ``extra``."""
+        return SNAPSHOT_HEADER_SIZE + self.values.size * (SNAPSHOT_DTYPE.itemsize + 1)
+
+    def save_snapshot(self, path):
+        """Write the whole table in the binary snapshot format.
+
+        The snapshot gets a new ``generation``, so delta records written for
+        an earlier one are never applied to it, and the table is clean again.
+        If the write fails, the table is left as it was, still matching the
+        snapshot on disk.
+        """
+        generation = int.from_bytes(os.urandom(8), "little")
+        extra = pickle.dumps(self.extra) if self.extra else b""
+        fields = [
+            SNAPSHOT_MAGIC,
+            SNAPSHOT_VERSION,
+            len(self.values),
+            len(self.actions),
+            SNAPSHOT_DTYPE.str.encode("ascii"),
+            self.encoder.encode("ascii"),
+            self.action_set_id().encode("ascii"),
+            generation,
+            len(extra),
+        ]
+        body = (
+            self.values.astype(SNAPSHOT_DTYPE).tobytes()
+            + self.visited.astype(np.uint8).tobytes()
+            + extra
+        )
+        header = SNAPSHOT_HEADER.pack(*fields, 0).ljust(SNAPSHOT_HEADER_SIZE, b"\x00")
+        crc = zlib.crc32(body, zlib.crc32(header))
+        header = SNAPSHOT_HEADER.pack(*fields, crc).ljust(SNAPSHOT_HEADER_SIZE, b"\x00")
+        atomic_write_bytes(path, header + body)
+        self.generation = generation
+        self.delta_sequence = 0
+        # Any records in the log are for an older snapshot now
+        self.delta_log_size = 0
+        self.dirty[:] = False
+
+    @classmethod
+    def open_snapshot(cls, path, encoder=None, actions=None):
+        """Map a snapshot read-only, without copying or unpickling anything.
+
+        Processes that map the same file share its pages. The table can't be
+        updated; ``copy()`` it for a private, writable one. With ``encoder``
+        or ``actions`` given, a snapshot of another encoder's states or
+        another action set raises ValueError, as does a truncated snapshot
+        or one that fails its checksum.
+        """
+        header = read_snapshot_header(path)
+        if header is None:
+            raise FileNotFoundError(path)
+        snapshot_encoder = header["encoder"]
+        num_states, num_actions = header["num_states"], header["num_actions"]
+        if encoder is not None and snapshot_encoder != encoder:
+            raise ValueError(
+                f"{path}: snapshot has {snapshot_encoder!r} states, expected {encoder!r}"
+            )
+        if actions is not None and header["actions"] != tuple(actions):
+            raise ValueError(
+                f"{path}: snapshot has actions {header['actions']}, "
+                f"expected {tuple(actions)}"
+            )
+        expected_states = 2 ** get_encoder(snapshot_encoder).num_features
+        if num_states != expected_states or header["actions"] is None:
+            raise ValueError(
+                f"{path}: snapshot is {num_states}x{num_actions}, "
+                f"expected {expected_states} states"
+            )
+        dtype = header["dtype"]
+        shape = (num_states, num_actions)
+        offset = SNAPSHOT_HEADER_SIZE
+        values_size = num_states * num_actions * dtype.itemsize
+        expected_size = offset + values_size + num_states * num_actions
+        expected_size += header["extra_size"]
+        if os.path.getsize(path) != expected_size:
+            raise ValueError(
+                f"{path}: snapshot is {os.path.getsize(path)} bytes, "
+                f"expected {expected_size}; it was truncated or overwritten"
+            )
+
+        # Plain ndarray views of the mappings: indexing a np.memmap goes
+        # through its subclass hooks, which is slow for single-row lookups
+        table = cls.__new__(cls)
+        table.encoder = snapshot_encoder
+        table.actions = header["actions"]
+        table.num_features = get_encoder(snapshot_encoder).num_features
+        body = np.memmap(path, dtype=np.uint8, mode="r", offset=offset)
+        if zlib.crc32(body, zlib.crc32(header["raw"])) != header["crc"]:
+            raise ValueError(f"{path}: snapshot is corrupt (checksum mismatch)")
+        table.values = np.asarray(body[:values_size]).view(dtype).reshape(shape)
+        table.visited = (
+            np.asarray(body[values_size : values_size + num_states * num_actions])
+            .view(bool)
+            .reshape(shape)
+        )
+        extra = body[expected_size - offset - header["extra_size"] :]
+        table.extra = pickle.loads(extra.tobytes()) if header["extra_size"] else {}
+        table.dirty = np.zeros(num_states, dtype=bool)
+        table.generation = header["generation"]
+        table.delta_sequence = 0
+        table.delta_log_size = None
+        return table
+
+    @classmethod
+    def load_snapshot(cls, path, delta_path=None):
+        """Read a snapshot into a writable table, then apply its delta log.
+
+        Raises ValueError if the snapshot or any delta record is corrupt.
+        """
+        table = cls.open_snapshot(path).copy()
+        if delta_path is not None:
+            table.apply_deltas(delta_path)
+        return table
+
+    def save_delta(self, path):
+        """Append the states updated since the last save to the delta log at
+        ``path``, so a save costs in proportion to what changed.
+
+        The record applies to the snapshot the table was last saved as or
+        loaded from; a table with neither raises ValueError. Anything in the
+        log past the records the table knows of, such as a record torn by a
+        crash, is cut off first. Returns the number of states written.
+        """
+        if self.generation is None:
+            raise ValueError("The table has no snapshot for a delta to apply to")
+        codes = np.flatnonzero(self.dirty)
+        if not len(codes):
+            return 0
+        body = (
+            codes.astype("<u4").tobytes()
+            + self.values[codes].astype(SNAPSHOT_DTYPE).tobytes()
+            + self.visited[codes].astype(np.uint8).tobytes()
+        )
+        fields = [DELTA_MAGIC, self.generation, self.delta_sequence, len(codes)]
+        crc = zlib.crc32(body, zlib.crc32(DELTA_HEADER.pack(*fields, 0)))
+        record = DELTA_HEADER.pack(*fields, crc) + body
+        with open(path, "ab") as f:
+            size = f.seek(0, os.SEEK_END)
+            if self.delta_log_size is not None and size > self.delta_log_size:
+                f.truncate(self.delta_log_size)
+                size = f.seek(0, os.SEEK_END)
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        self.delta_log_size = size + len(record)
+        self.delta_sequence += 1
+        self.dirty[:] = False
+        return len(codes)
+
+    def apply_deltas(self, path):
+        """Apply the records of the delta log at ``path`` for this table's
+        snapshot, in order; returns how many there were.
+
+        Records left over from earlier snapshots are skipped: a full
+        snapshot already holds their changes. So is a final record cut short,
+        which is what a crash part way through ``save_delta`` leaves; the
+        next ``save_delta`` cuts it off. A complete record that is corrupt,
+        or a gap in the sequence, raises ValueError.
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.delta_log_size = 0
+            return 0
+        num_actions = len(self.actions)
+        row_size = 4 + num_actions * (SNAPSHOT_DTYPE.itemsize + 1)
+        applied = 0
+        offset = 0
+        while offset < len(data):
+            if len(data) - offset < DELTA_HEADER.size:
+                break  # Torn append
+            magic, generation, sequence, count, crc = DELTA_HEADER.unpack_from(
+                data, offset
+            )
+            if magic != DELTA_MAGIC:
+                raise ValueError(f"{path}: corrupt delta record at byte {offset}")
+            start = offset + DELTA_HEADER.size
+            end = start + count * row_size
+            if end > len(data):
+                break  # Torn append
+            header = DELTA_HEADER.pack(magic, generation, sequence, count, 0)
+            if zlib.crc32(data[start:end], zlib.crc32(header)) != crc:
+                raise ValueError(
+                    f"{path}: delta record at byte {offset} is corrupt "
+                    "(checksum mismatch)"
+                )
+            if generation == self.generation:
+                if sequence != applied:
+                    raise ValueError(
+                        f"{path}: delta record {sequence} at byte {offset}, "
+                        f"expected record {applied}"
+                    )
+                codes = np.frombuffer(data, "<u4", count, start)
+                start += count * 4
+                values = np.frombuffer(data, SNAPSHOT_DTYPE, count * num_actions, start)
+                start += values.nbytes
+                visited = np.frombuffer(data, np.uint8, count * num_actions, start)
+                self.values[codes] = values.reshape(count, num_actions)
+                self.visited[codes] = visited.reshape(count, num_actions).view(bool)
+                applied += 1
+            offset = end
+        self.delta_sequence = applied
+        self.delta_log_size = offset
+        return applied
@@ -0,0 +1,141 @@
+# replay_buffer.py
+
+import numpy as np
+
+
+class SumTree:
+    """Binary tree of sums over ``capacity`` non-negative leaf values.
+
+    Updating a batch of leaves and drawing leaves in proportion to their
+    values both walk one root-to-leaf path per item, O(log capacity), rather
+    than the O(capacity) of normalizing every value for each draw.
+    """
+
+    def __init__(self, capacity):
+        self.leaves = 1 << (capacity - 1).bit_length()
+        self.depth = self.leaves.bit_length() - 1
+        # Node 1 is the root, node n has children 2n and 2n + 1, and leaf i
+        # is node leaves + i
+        self.tree = np.zeros(2 * self.leaves)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def values(self, indices):
+        return self.tree[np.asarray(indices) + self.leaves]
+
+    def update(self, indices, values):
+        nodes = np.asarray(indices) + self.leaves
+        self.tree[nodes] = values
+        for _ in range(self.depth):
+            # Repeated parents just get the same sum written twice
+            nodes = nodes >> 1
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, targets):
+        """The leaf whose slice of the running total holds each target, for
+        targets in ``[0, total)``."""
+        targets = np.array(targets, dtype=np.float64)
+        nodes = np.ones(len(targets), dtype=np.int64)
+        for _ in range(self.depth):
+            nodes *= 2
+            left = self.tree[nodes]
+            right = targets >= left
+            targets -= np.where(right, left, 0.0)
+            nodes += right
+        return nodes - self.leaves
+
+
+class ReplayBuffer:
+    """Fixed-capacity ring of transitions in preallocated NumPy arrays.
+
+    States are stored packed (see ``q_table.encode_state``), so a transition
+    costs 10 bytes plus its priority. Once full, the oldest transitions are
+    overwritten. With ``prioritized=True`` samples are drawn in proportion to
+    ``priority ** alpha`` and come with importance-sampling weights; the
+    scaled priorities are kept in a SumTree, so a minibatch costs
+    O(batch_size * log capacity) however full the buffer is.
+    """
+
+    def __init__(self, capacity, prioritized=False, alpha=0.6, beta=0.4, seed=None):
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.rng = np.random.default_rng(seed)
+
+        self.states = np.zeros(capacity, dtype=np.uint16)
+        self.actions = np.zeros(capacity, dtype=np.uint8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.uint16)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.priorities = np.zeros(capacity, dtype=np.float32)
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity) if prioritized else None
+        # Indices added since the tree was last updated; they're written to
+        # it in one batch before the next sample
+        self.pending = []
+        self.size = 0
+        self.next_index = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+        i = self.next_index
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        # New transitions get the highest priority seen so far, so they are
+        # likely to be replayed before their TD error is known
+        self.priorities[i] = self.max_priority
+        if self.tree is not None:
+            self.pending.append(i)
+        self.next_index = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size):
+        """Draw ``batch_size`` indices; returns ``(indices, weights)``.
+
+        Weights are all 1 for uniform sampling.
+        """
+        if not self.prioritized:
+            indices = self.rng.integers(0, self.size, size=batch_size)
+            return indices, np.ones(batch_size)
+
+        self.flush()
+        total = self.tree.total
+        indices = self.tree.find(self.rng.random(batch_size) * total)
+        # Rounding can carry a draw past the last filled leaf
+        indices = np.minimum(indices, self.size - 1)
+        probs = self.tree.values(indices) / total
+        weights = (self.size * probs) ** -self.beta
+        return indices, weights / weights.max()
+
+    def flush(self):
+        if self.pending:
+            indices = np.array(self.pending)
+            self.tree.update(indices, self.scaled(self.priorities[indices]))
+            self.pending = []
+
+    def scaled(self, priorities):
+        return priorities.astype(np.float64) ** self.alpha
+
+    def batch(self, indices):
+        return (
+            self.states[indices].astype(np.int64),
+            self.actions[indices].astype(np.int64),
+            self.rewards[indices].astype(np.float64),
+            self.next_states[indices].astype(np.int64),
+            self.dones[indices],
+        )
+
+    def update_priorities(self, indices, errors, eps=1e-3):
+        priorities = np.abs(errors) + eps
+        self.priorities[indices] = priorities
+        if self.tree is not None:
+            self.tree.update(indices, self.scaled(self.priorities[indices]))
+        self.max_priority = max(self.max_priority, float(priorities.max()))
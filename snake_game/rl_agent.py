@@ -1,33 +1,68 @@
 # rl_agent.py
 
-import pygame
+import numpy as np
 import sys
 import random
 import os
 import json
-import pickle
 import math
+import time
 from datetime import datetime
-from game_objects import (
-    screen,
-    screen_width,
-    screen_height,
-    clock,
-    draw_snake,
-    draw_food,
-    black,
-    white,
-    green,
-    red,
-)
-from high_score_utils import read_high_scores, update_high_scores
+from agent_db import AgentDB
+from exploration import ExplorationSchedule, agent_schedule
+from profiler import Profiler
+from loop_detector import WindowCounter, position_key
+from high_score_utils import TOP_K, HighScoreStore, read_high_scores
+from episode_log import append_episode, episode_log_path
+from file_utils import atomic_write_json
+from q_table import ACTION_INDEX, QTable, encode_state, load_saved_table
+from replay_buffer import ReplayBuffer
+from safety import safe_actions
+from directions import RELATIVE_ACTIONS, VALID_ACTIONS
+from state_encoders import DEFAULT_ENCODER, agent_encoder_id, get_encoder
+from snake_env import ACTIONS, SnakeEnv, board_height, board_width
 
 # Agent folder setup
 AGENT_FOLDER = "agents"
 os.makedirs(AGENT_FOLDER, exist_ok=True)
 
+# Q-table checkpoints are written every CHECKPOINT_EPISODES games or every
+# CHECKPOINT_SECONDS seconds, whichever comes first
+CHECKPOINT_EPISODES = 25
+CHECKPOINT_SECONDS = 60.0
+
+# Checkpoints append the changed states to a delta log; once the log is this
+# fraction of a full snapshot's size, the next one rewrites the snapshot
+DELTA_COMPACT_RATIO = 0.5
+
+# Set to True to gzip the per-agent episode log
+COMPRESS_EPISODE_LOG = False
+
+# Set to a profiler.Profiler to time the phases of the training loop
+PROFILER = None
+
+# Set to a path (e.g. "agents/agents.db") to also keep agents, per-episode
+# summaries and Q-table snapshots in an SQLite database (see agent_db.py)
+AGENT_DB = None
+
+# Experience replay defaults; agents can override them with the
+# "replay_capacity", "replay_batch_size" (0 disables replay) and
+# "replay_prioritized" settings
+REPLAY_CAPACITY = 50_000
+REPLAY_BATCH_SIZE = 32
+REPLAY_EVERY = 4
+REPLAY_WARMUP = 1_000
+
+# A step is penalized as a loop when its state already occurred more than
+# once in the previous LOOP_WINDOW steps. Agents can also penalize returning
+# to an earlier board position (same body and head) within the last
+# "revisit_horizon" steps, by "revisit_penalty"; this is off by default
+LOOP_WINDOW = 5
+LOOP_PENALTY = 5
+REVISIT_PENALTY = 5
+
 # Initialize Q-table
-Q_table = {}
+Q_table = QTable()
 
 # Agent-related functions
 
@@ -39,7 +74,21 @@ def create_agent(
     exploration_rate,
     exploration_decay,
     min_exploration_rate,
+    exploration_schedule=None,
+    state_encoder=DEFAULT_ENCODER,
+    action_mode="absolute",
 ):
+    """Create and save a new agent.
+
+    ``exploration_schedule`` is an optional ``exploration.ExplorationSchedule``
+    config; without one the exploration rate decays by ``exploration_decay``
+    every step. ``state_encoder`` is the id of the agent's state encoder (see
+    state_encoders.py). ``action_mode`` "relative" makes the agent choose
+    between going straight and turning left or right.
+    """
+    get_encoder(state_encoder)  # Fail early on unknown ids
+    if action_mode not in ("absolute", "relative"):
+        raise ValueError(f"Unknown action mode {action_mode!r}")
     agent_data = {
         "name": agent_name,
         "learning_rate": learning_rate,
@@ -48,31 +97,81 @@ def create_agent(
         "exploration_decay": exploration_decay,
         "min_exploration_rate": min_exploration_rate,
         "learning_cycles": 0,
+        "state_encoder": state_encoder,
+        "action_mode": action_mode,
         "history": [],
     }
-    with open(os.path.join(AGENT_FOLDER, f"{agent_name}.json"), "w") as f:
-        json.dump(agent_data, f)
+    if exploration_schedule:
+        ExplorationSchedule.from_config(exploration_schedule)  # Fail early
+        agent_data["exploration_schedule"] = exploration_schedule
+    save_agent(agent_data)
+    db = open_agent_db()
+    if db is not None:
+        db.save_agent(agent_data)
+        db.close()
 
 
 def load_agent(agent_name):
     try:
         with open(os.path.join(AGENT_FOLDER, f"{agent_name}.json"), "r") as f:
-            return json.load(f)
+            agent_data = json.load(f)
     except FileNotFoundError:
         print(f"Agent {agent_name} not found.")
         return None
+    # The step history lives in the episode log; older agent files still
+    # carry the last game's history inline
+    agent_data.setdefault("history", [])
+    return agent_data
 
 
 def save_agent(agent_data):
-    with open(os.path.join(AGENT_FOLDER, f"{agent_data['name']}.json"), "w") as f:
-        json.dump(agent_data, f)
+    """Write the agent's settings and counters, without the step history."""
+    metadata = {key: value for key, value in agent_data.items() if key != "history"}
+    atomic_write_json(
+        os.path.join(AGENT_FOLDER, f"{agent_data['name']}.json"), metadata
+    )
+
+
+def agent_episode_log(agent_name):
+    return episode_log_path(AGENT_FOLDER, agent_name, COMPRESS_EPISODE_LOG)
+
+
+def agent_high_score_stores(agent_data):
+    """The global leaderboard and the agent's own one.
+
+    The agent's board keeps its best ``high_scores_k`` games (TOP_K by
+    default) in ``<name>_high_scores.json`` in the agents folder.
+    """
+    name = agent_data["name"]
+    return [
+        HighScoreStore(),
+        HighScoreStore(
+            os.path.join(AGENT_FOLDER, f"{name}_high_scores.json"),
+            agent_data.get("high_scores_k", TOP_K),
+        ),
+    ]
+
+
+def leaderboard_name(agent_data):
+    timestamp = datetime.utcnow().strftime("%Y%m%d")
+    return f"{agent_data['name']}-{agent_data['learning_cycles']}-{timestamp}"
+
+
+def open_agent_db():
+    """The agents database if ``AGENT_DB`` is set, else None."""
+    return AgentDB(AGENT_DB) if AGENT_DB else None
 
 
 def list_agents():
+    db = open_agent_db()
+    if db is not None:
+        names = db.list_agents()
+        db.close()
+        return names
     agents = [
         f
         for f in os.listdir(AGENT_FOLDER)
-        if f.endswith(".json") and not f.endswith("_q_table.pkl")
+        if f.endswith(".json") and not f.endswith("_high_scores.json")
     ]
     return [agent.replace(".json", "") for agent in agents]
 
@@ -80,25 +179,101 @@ def list_agents():
 # Q-table functions
 
 
-def save_q_table(agent_name):
-    global Q_table
-    try:
-        with open(os.path.join(AGENT_FOLDER, f"{agent_name}_q_table.pkl"), "wb") as f:
-            pickle.dump(Q_table, f)
-    except Exception as e:
-        print(f"Error saving Q-table: {e}")
+def q_snapshot_path(agent_name):
+    return os.path.join(AGENT_FOLDER, f"{agent_name}_q_table.bin")
 
 
-def load_q_table(agent_name):
-    global Q_table
+def q_delta_path(agent_name):
+    return os.path.join(AGENT_FOLDER, f"{agent_name}_q_table.delta")
+
+
+def q_pickle_path(agent_name):
+    # Where Q-tables were saved before the binary format; still read
+    return os.path.join(AGENT_FOLDER, f"{agent_name}_q_table.pkl")
+
+
+def save_q_table(agent_name, full=False):
+    """Checkpoint ``Q_table``.
+
+    Usually this appends the states updated since the last save to the
+    agent's delta log, which costs in proportion to what changed. A full
+    snapshot is written instead, and the log emptied, when ``full`` is set,
+    when the table has no snapshot yet, or once the log has grown past
+    DELTA_COMPACT_RATIO of a snapshot's size.
+
+    A failed write raises: carrying on would leave training that is never
+    saved, or deltas that no snapshot on disk matches.
+    """
+    snapshot_path, delta_path = q_snapshot_path(agent_name), q_delta_path(agent_name)
     try:
-        with open(os.path.join(AGENT_FOLDER, f"{agent_name}_q_table.pkl"), "rb") as f:
-            Q_table = pickle.load(f)
+        log_size = os.path.getsize(delta_path)
     except FileNotFoundError:
-        Q_table = {}
-    except Exception as e:
-        print(f"Error loading Q-table: {e}")
-        Q_table = {}
+        log_size = 0
+    if (
+        full
+        or Q_table.generation is None
+        or not os.path.exists(snapshot_path)
+        or log_size > DELTA_COMPACT_RATIO * Q_table.snapshot_size()
+    ):
+        Q_table.save_snapshot(snapshot_path)
+        if log_size:
+            os.remove(delta_path)
+    else:
+        Q_table.save_delta(delta_path)
+
+
+def load_q_table(agent_name, encoder=DEFAULT_ENCODER, actions=ACTIONS):
+    """Load the agent's Q-table into ``Q_table``; a missing one starts empty.
+
+    A table learnt on other states than ``encoder``'s, or with other
+    ``actions``, raises ValueError instead of being mixed with them, and so
+    does a corrupt snapshot, delta log or pickle.
+    """
+    global Q_table
+    table = load_saved_table(
+        q_snapshot_path(agent_name), q_delta_path(agent_name), q_pickle_path(agent_name)
+    )
+    if table is None:
+        table = QTable(encoder, actions)
+    if table.encoder != encoder:
+        raise ValueError(
+            f"{agent_name}'s Q-table has {table.encoder!r} states, "
+            f"but the agent uses the {encoder!r} encoder"
+        )
+    if table.actions != tuple(actions):
+        raise ValueError(
+            f"{agent_name}'s Q-table has actions {table.actions}, "
+            f"but the agent uses {tuple(actions)}"
+        )
+    Q_table = table
+
+
+def open_q_snapshot(
+    agent_name, merged_folder, encoder=DEFAULT_ENCODER, actions=ACTIONS
+):
+    """Map the agent's Q-table snapshot read-only into ``Q_table``.
+
+    Returns the path of the file mapped, for other processes to map too, or
+    None if the agent has no Q-table yet. The agent's own snapshot is mapped
+    when it's up to date. If changes are pending in its delta log, or the
+    table is still in a pickle, the current table is written to
+    ``<name>_q_table.merged.bin`` in ``merged_folder`` (e.g. a temporary
+    directory) and that is mapped instead; nothing is written to the agent
+    folder, whose files are left to the process training it. As with
+    ``load_q_table``, a table of another encoder's states or other actions,
+    or a corrupt one, raises ValueError.
+    """
+    global Q_table
+    snapshot_path, delta_path = q_snapshot_path(agent_name), q_delta_path(agent_name)
+    if not os.path.exists(snapshot_path) or os.path.exists(delta_path):
+        table = load_saved_table(snapshot_path, delta_path, q_pickle_path(agent_name))
+        if table is None:
+            Q_table = QTable(encoder, actions)
+            return None
+        snapshot_path = os.path.join(merged_folder, f"{agent_name}_q_table.merged.bin")
+        table.save_snapshot(snapshot_path)
+    Q_table = QTable.open_snapshot(snapshot_path, encoder, actions)
+    return snapshot_path
 
 
 # Utility functions
@@ -112,115 +287,34 @@ def calculate_distance_to_food(snake_pos, food_pos):
     return distance
 
 
-def calculate_distance_to_wall(snake_pos, screen_width, screen_height):
+def calculate_distance_to_wall(snake_pos, width, height):
     """Calculate the shortest distance from the snake's head to the nearest wall."""
     distance_left = snake_pos[0]
-    distance_right = screen_width - snake_pos[0]
+    distance_right = width - snake_pos[0]
     distance_top = snake_pos[1]
-    distance_bottom = screen_height - snake_pos[1]
+    distance_bottom = height - snake_pos[1]
 
     # Return the shortest distance to any wall
     return min(distance_left, distance_right, distance_top, distance_bottom)
 
 
-def is_collision(point, snake_body):
-    # Check if the point is hitting the wall
-    if (
-        point[0] < 0
-        or point[0] >= screen_width
-        or point[1] < 0
-        or point[1] >= screen_height
-    ):
-        return True
-    # Check if the point is hitting itself
-    if point in snake_body[1:]:
-        return True
-    return False
-
-
-def is_danger_straight(snake_pos, snake_body, snake_direction):
-    x, y = snake_pos
-    if snake_direction == "UP":
-        x, y = x, y - 10
-    elif snake_direction == "DOWN":
-        x, y = x, y + 10
-    elif snake_direction == "LEFT":
-        x, y = x - 10, y
-    elif snake_direction == "RIGHT":
-        x, y = x + 10, y
-    return is_collision([x, y], snake_body)
-
-
-def is_danger_left(snake_pos, snake_body, snake_direction):
-    x, y = snake_pos
-    if snake_direction == "UP":
-        x, y = x - 10, y
-    elif snake_direction == "DOWN":
-        x, y = x + 10, y
-    elif snake_direction == "LEFT":
-        x, y = x, y + 10
-    elif snake_direction == "RIGHT":
-        x, y = x, y - 10
-    return is_collision([x, y], snake_body)
-
-
-def is_danger_right(snake_pos, snake_body, snake_direction):
-    x, y = snake_pos
-    if snake_direction == "UP":
-        x, y = x + 10, y
-    elif snake_direction == "DOWN":
-        x, y = x - 10, y
-    elif snake_direction == "LEFT":
-        x, y = x, y - 10
-    elif snake_direction == "RIGHT":
-        x, y = x, y + 10
-    return is_collision([x, y], snake_body)
-
-
-def get_state(snake_pos, snake_body, food_pos, snake_direction):
-    # Danger indicators
-    danger_straight = is_danger_straight(snake_pos, snake_body, snake_direction)
-    danger_left = is_danger_left(snake_pos, snake_body, snake_direction)
-    danger_right = is_danger_right(snake_pos, snake_body, snake_direction)
-
-    # Food direction
-    food_left = food_pos[0] < snake_pos[0]
-    food_right = food_pos[0] > snake_pos[0]
-    food_up = food_pos[1] < snake_pos[1]
-    food_down = food_pos[1] > snake_pos[1]
-
-    # Snake movement direction
-    moving_left = snake_direction == "LEFT"
-    moving_right = snake_direction == "RIGHT"
-    moving_up = snake_direction == "UP"
-    moving_down = snake_direction == "DOWN"
-
-    state = (
-        danger_straight,
-        danger_left,
-        danger_right,
-        moving_left,
-        moving_right,
-        moving_up,
-        moving_down,
-        food_left,
-        food_right,
-        food_up,
-        food_down,
-    )
-    return state
-
+def choose_action(state, valid_actions, agent_data, mode, rng=random, mask=None):
+    """Epsilon-greedy choice among ``valid_actions``.
 
-def choose_action(state, valid_actions, agent_data, mode):
+    ``mask``, if given, is the subset of them the agent may take (see
+    ``safety.safe_actions``); both the random and the greedy choice keep to it.
+    """
+    if mask is not None:
+        valid_actions = mask
     exploration_rate = agent_data["exploration_rate"] if mode == "learning" else 0.1
-    if random.uniform(0, 1) < exploration_rate:
-        return random.choice(valid_actions)
+    if rng.uniform(0, 1) < exploration_rate:
+        return rng.choice(valid_actions)
     else:
-        state_actions = Q_table.get(state, {})
-        if state_actions:
-            return max(state_actions, key=state_actions.get)
+        best_action = Q_table.best_action(state, mask)
+        if best_action is not None:
+            return best_action
         else:
-            return random.choice(valid_actions)
+            return rng.choice(valid_actions)
 
 
 def update_q_table(
@@ -237,8 +331,8 @@ def update_q_table(
     learning_rate = agent_data["learning_rate"]
     discount_factor = agent_data["discount_factor"]
 
-    current_q = Q_table.get(state, {}).get(action, 0)
-    max_future_q = max(Q_table.get(next_state, {}).values(), default=0)
+    current_q = Q_table.get(state, action)
+    max_future_q = Q_table.max_q(next_state)
 
     # Calculate the Euclidean distance to food
     current_distance = calculate_distance_to_food(snake_pos, food_pos)
@@ -263,189 +357,402 @@ def update_q_table(
         reward + discount_factor * max_future_q - current_q
     )
 
-    if state not in Q_table:
-        Q_table[state] = {}
-    Q_table[state][action] = new_q
+    Q_table.set(state, action, new_q)
 
+    # The shaped reward, for storing in the replay buffer
+    return reward
 
-def detect_loop(history, current_state, loop_threshold=5):
-    # Check if the current state has appeared in the last `loop_threshold` moves
-    recent_states = [
-        h[0] for h in history[-loop_threshold:]
-    ]  # Extract states from history
-    return recent_states.count(current_state) > 1
 
+def make_replay_buffer(agent_data, seed=None):
+    """The replay buffer described by the agent's settings, or None if disabled."""
+    batch_size = agent_data.get("replay_batch_size", REPLAY_BATCH_SIZE)
+    if not batch_size:
+        return None
+    return ReplayBuffer(
+        agent_data.get("replay_capacity", REPLAY_CAPACITY),
+        prioritized=agent_data.get("replay_prioritized", False),
+        seed=seed,
+    )
 
-def rl_main(agent_name, mode="learning"):
-    agent_data = load_agent(agent_name)
-    if not agent_data:
-        return
-    load_q_table(agent_name)
 
-    # Load agent-specific parameters
-    learning_rate = agent_data["learning_rate"]
-    discount_factor = agent_data["discount_factor"]
-    exploration_rate = agent_data["exploration_rate"]
-    exploration_decay = agent_data["exploration_decay"]
-    min_exploration_rate = agent_data["min_exploration_rate"]
+def replay_update(replay, agent_data):
+    """One minibatch Q-learning update from transitions sampled out of ``replay``."""
+    batch_size = agent_data.get("replay_batch_size", REPLAY_BATCH_SIZE)
+    indices, weights = replay.sample(batch_size)
+    codes, actions, rewards, next_codes, dones = replay.batch(indices)
 
-    # Ask for the number of games in the Pygame window
-    num_games = 1
-    if mode == "learning":
-        num_games = display_text_input("Enter the number of games to run:", 1)
+    max_future_q = np.where(dones, 0.0, Q_table.max_q_batch(next_codes))
+    targets = rewards + agent_data["discount_factor"] * max_future_q
+    errors = targets - Q_table.values[codes, actions]
+    Q_table.update(codes, actions, targets, agent_data["learning_rate"], weights)
+    replay.update_priorities(indices, errors)
 
-    learning_speed = 100  # Speed for accelerated training
 
-    for game_num in range(1, num_games + 1):
-        session_cycles = 0
-        snake_pos = [100, 50]
-        snake_body = [[100, 50], [90, 50], [80, 50]]
-        snake_direction = "RIGHT"
-        food_pos = [
-            random.randrange(1, (screen_width // 10)) * 10,
-            random.randrange(1, (screen_height // 10)) * 10,
-        ]
-        food_spawn = True
-        score = 0
-        game_over = False
-        agent_data["history"] = []
-
-        while not game_over:
-            state = get_state(snake_pos, snake_body, food_pos, snake_direction)
-            valid_actions = ["UP", "DOWN", "LEFT", "RIGHT"]
-
-            # Prevent reversing direction
-            if snake_direction == "UP":
-                valid_actions.remove("DOWN")
-            elif snake_direction == "DOWN":
-                valid_actions.remove("UP")
-            elif snake_direction == "LEFT":
-                valid_actions.remove("RIGHT")
-            elif snake_direction == "RIGHT":
-                valid_actions.remove("LEFT")
-
-            action = choose_action(state, valid_actions, agent_data, mode)
-            snake_direction = action
-
-            # Before moving the snake
-            snake_pos_before_move = snake_pos.copy()
-
-            # Move the snake
-            if snake_direction == "UP":
-                snake_pos[1] -= 10
-            elif snake_direction == "DOWN":
-                snake_pos[1] += 10
-            elif snake_direction == "LEFT":
-                snake_pos[0] -= 10
-            elif snake_direction == "RIGHT":
-                snake_pos[0] += 10
-
-            # After moving the snake
-            snake_pos_after_move = snake_pos.copy()
-
-            # Update the snake body
-            snake_body.insert(0, list(snake_pos_after_move))
-
-            # Check for food consumption
-            if (
-                snake_pos_after_move[0] == food_pos[0]
-                and snake_pos_after_move[1] == food_pos[1]
-            ):
-                score += 1
-                reward = 10  # Reward for eating food
-                food_spawn = False
-            else:
-                snake_body.pop()
-                reward = -0.1  # Penalty for movement without food
-
-            if not food_spawn:
-                food_pos = [
-                    random.randrange(1, (screen_width // 10)) * 10,
-                    random.randrange(1, (screen_height // 10)) * 10,
-                ]
-            food_spawn = True
-
-            if detect_loop(agent_data["history"], state):
-                reward -= 5  # Penalize the agent for looping
-
-            # Check for game over conditions
-            if is_collision(snake_pos_after_move, snake_body):
-                reward = -100  # Penalty for dying
-                game_over = True
+def agent_actions(agent_data):
+    """The agent's action set: absolute, or relative with ``action_mode``."""
+    if agent_data.get("action_mode") == "relative":
+        return RELATIVE_ACTIONS
+    return tuple(ACTIONS)
+
+
+def valid_actions_for(snake_direction, relative=False):
+    """The actions that don't reverse the snake, as a shared tuple.
+
+    ``snake_direction`` is a heading name or int. Relative actions never
+    reverse, so their mask is always all three of them.
+    """
+    if relative:
+        return RELATIVE_ACTIONS
+    return VALID_ACTIONS[snake_direction]
 
-            # Calculate next_state with updated position and direction
-            next_state = get_state(
-                snake_pos_after_move, snake_body, food_pos, snake_direction
-            )
 
-            # Update Q-table
-            update_q_table(
-                state,
-                action,
-                reward,
-                next_state,
-                agent_data,
-                snake_pos_before_move,
-                food_pos,
-                snake_pos_after_move,
-                food_pos,
+def play_episode(
+    env, agent_data, mode="learning", on_step=None, replay=None, rng=random
+):
+    """Play one game in ``env`` and update the Q-table from every step.
+
+    ``on_step`` is called with the env after each step; the pygame viewer
+    uses it to draw the board. With a ``replay`` buffer, every transition is
+    also stored there and a minibatch is replayed every REPLAY_EVERY steps.
+    ``rng`` drives exploration. Returns the final score. Agents with
+    ``action_mode`` "relative" go straight or turn. With ``safety_mask``
+    set in the agent's JSON, moves that trap the snake are masked out, and a
+    game ends after ``max_idle_steps`` steps (default: the board area)
+    without food.
+
+    With ``PROFILER`` set, every phase of a step is timed.
+
+    In learning mode the exploration rate follows the agent's
+    ``exploration_schedule``, evaluated at ``learning_cycles`` or at
+    ``steps_trained`` plus the steps of this game, or else decays by
+    ``exploration_decay`` every step.
+    """
+    profiler = PROFILER
+    env.profiler = profiler
+    state = env.reset()
+    agent_data["history"] = []
+    game_over = False
+
+    schedule = agent_schedule(agent_data) if mode == "learning" else None
+    if schedule is not None:
+        steps_trained = agent_data.get("steps_trained", 0)
+        clock = agent_data["learning_cycles"]
+        if schedule.unit == "step":
+            clock = steps_trained
+        agent_data["exploration_rate"] = schedule(clock)
+
+    relative = agent_data.get("action_mode") == "relative"
+    safety_mask = agent_data.get("safety_mask", False)
+    if safety_mask:
+        # A masked snake can follow its tail forever, so a game that goes
+        # this long without food ends as a timeout, as in evaluate.py
+        max_idle_steps = agent_data.get("max_idle_steps") or env.width * env.height
+        idle_steps = 0
+
+    loops = WindowCounter(LOOP_WINDOW)
+    revisit_horizon = agent_data.get("revisit_horizon", 0)
+    if revisit_horizon:
+        revisit_penalty = agent_data.get("revisit_penalty", REVISIT_PENALTY)
+        positions = WindowCounter(revisit_horizon)
+        positions.push(position_key(env.snake_body))
+
+    while not game_over:
+        if profiler:
+            start = time.perf_counter()
+        valid_actions = RELATIVE_ACTIONS if relative else VALID_ACTIONS[env.heading]
+        mask = safe_actions(env, valid_actions) if safety_mask else None
+        action = choose_action(state, valid_actions, agent_data, mode, rng, mask)
+        if profiler:
+            profiler.lap("choose_action", start)
+
+        # Before moving the snake
+        snake_pos_before_move = env.snake_pos.copy()
+
+        score = env.score
+        next_state, reward, game_over = env.step(action)
+        if safety_mask and not game_over:
+            idle_steps = 0 if env.score > score else idle_steps + 1
+            if idle_steps >= max_idle_steps:
+                game_over = True
+                env.end_reason = "timeout"
+
+        if profiler:
+            start = time.perf_counter()
+        code = encode_state(state)
+        if not game_over and loops.count(code) > 1:
+            reward -= LOOP_PENALTY  # Penalize the agent for looping
+        loops.push(code)
+        if revisit_horizon and not game_over:
+            position = position_key(env.snake_body)
+            if positions.count(position):
+                reward -= revisit_penalty  # Back to an earlier board position
+            positions.push(position)
+        if profiler:
+            start = profiler.lap("detect_loop", start)
+
+        # Update Q-table
+        shaped_reward = update_q_table(
+            state,
+            action,
+            reward,
+            next_state,
+            agent_data,
+            snake_pos_before_move,
+            env.food_pos,
+            env.snake_pos,
+            env.food_pos,
+        )
+        if profiler:
+            start = profiler.lap("update_q_table", start)
+
+        agent_data["history"].append((state, action, reward, next_state))
+
+        if replay is not None:
+            replay.add(
+                code,
+                ACTION_INDEX[action],
+                shaped_reward,
+                encode_state(next_state),
+                game_over,
             )
+            if env.steps % REPLAY_EVERY == 0 and len(replay) >= REPLAY_WARMUP:
+                replay_update(replay, agent_data)
+
+        if schedule is not None:
+            if schedule.unit == "step":
+                agent_data["exploration_rate"] = schedule(steps_trained + env.steps)
+        elif mode == "learning":
+            exploration_rate = agent_data["exploration_rate"]
+            exploration_rate = max(
+                agent_data["min_exploration_rate"],
+                exploration_rate * agent_data["exploration_decay"],
+            )
+            agent_data["exploration_rate"] = exploration_rate
+        if profiler:
+            profiler.lap("replay_bookkeeping", start)
 
-            agent_data["history"].append((state, action, reward, next_state))
+        if on_step is not None:
+            on_step(env)
 
-            if mode == "learning":
-                exploration_rate = agent_data["exploration_rate"]
-                exploration_rate = max(
-                    agent_data["min_exploration_rate"],
-                    exploration_rate * agent_data["exploration_decay"],
-                )
-                agent_data["exploration_rate"] = exploration_rate
+        state = next_state
 
-            # Render the game in learning mode at accelerated speed
-            screen.fill(black)
-            draw_snake(snake_body)
-            draw_food(food_pos)
-            font = pygame.font.Font("freesansbold.ttf", 24)
-            score_text = font.render(f"Score: {score}", True, white)
-            session_text = font.render(
-                f"Session: {game_num}/{num_games}", True, white
-            )  # Display session number
+    if schedule is not None:
+        agent_data["steps_trained"] = steps_trained + env.steps
+    if profiler:
+        profiler.episode_done(env.steps)
+    return env.score
 
-            # Display score and session number
-            screen.blit(score_text, (10, 10))
-            screen.blit(session_text, (10, 40))
 
-            pygame.display.update()
+class Checkpointer:
+    """Saves an agent and its Q-table every few episodes or seconds.
 
-            clock.tick(learning_speed if mode == "learning" else 10)
+    Scores passed to ``add_score`` are buffered and written to the
+    leaderboards at the same checkpoints, as are the summaries passed to
+    ``add_episode`` when the agents database is enabled. The final save also
+    stores a Q-table snapshot there.
+    """
+
+    def __init__(
+        self, agent_data, episodes=CHECKPOINT_EPISODES, seconds=CHECKPOINT_SECONDS
+    ):
+        self.agent_data = agent_data
+        self.episodes = episodes
+        self.seconds = seconds
+        self.pending = 0
+        self.last_save = time.monotonic()
+        self.high_scores = agent_high_score_stores(agent_data)
+        self.db = open_agent_db()
+        self.episode_summaries = []
+        self.episode_start = time.monotonic()
+
+    def add_episode(self, episode, score, steps, exploration_rate, seed):
+        now = time.monotonic()
+        if self.db is not None:
+            duration = now - self.episode_start
+            self.episode_summaries.append(
+                (episode, score, steps, exploration_rate, duration, seed)
+            )
+        self.episode_start = now
+
+    def add_score(self, score, name):
+        for store in self.high_scores:
+            store.add(score, name)
+
+    def episode_done(self):
+        self.pending += 1
+        if (
+            self.pending >= self.episodes
+            or time.monotonic() - self.last_save >= self.seconds
+        ):
+            self.save()
+
+    def save(self, final=False):
+        profiler = PROFILER
+        start = time.perf_counter()
+        name = self.agent_data["name"]
+        save_agent(self.agent_data)
+        if profiler:
+            start = profiler.lap("save_agent", start)
+        save_q_table(name)
+        if profiler:
+            start = profiler.lap("save_q_table", start)
+        for store in self.high_scores:
+            store.flush()
+        if profiler:
+            start = profiler.lap("high_scores", start)
+        if self.db is not None:
+            self.db.save_agent(self.agent_data)
+            self.db.add_episodes(name, self.episode_summaries)
+            self.episode_summaries = []
+            if final:
+                self.db.save_q_snapshot(
+                    name, Q_table, self.agent_data["learning_cycles"]
+                )
+            if profiler:
+                profiler.lap("agent_db", start)
+        self.pending = 0
+        self.last_save = time.monotonic()
 
-        # End of the game logic
-        session_cycles += 1
-        if mode == "learning":
-            agent_data["learning_cycles"] += 1
-            save_agent(agent_data)
 
-        save_q_table(agent_name)
-        timestamp = datetime.utcnow().strftime("%Y%m%d")
-        leaderboard_name = (
-            f"{agent_data['name']}-{agent_data['learning_cycles']}-{timestamp}"
+def finish_episode(agent_data, env, checkpointer, mode="learning"):
+    """Log the game that just ended in ``env``, checkpoint when due and record the score."""
+    score = env.score
+    if mode == "learning":
+        agent_data["learning_cycles"] += 1
+        start = time.perf_counter()
+        append_episode(
+            agent_episode_log(agent_data["name"]),
+            score,
+            agent_data["history"],
+            env.episode_seed,
+        )
+        if PROFILER:
+            PROFILER.lap("episode_log", start)
+        checkpointer.add_episode(
+            agent_data["learning_cycles"],
+            score,
+            env.steps,
+            agent_data["exploration_rate"],
+            env.episode_seed,
         )
-        update_high_scores(score, leaderboard_name)
+
+    checkpointer.add_score(score, leaderboard_name(agent_data))
+    checkpointer.episode_done()
+
+
+def train(agent_name, episodes, seed=None, width=board_width, height=board_height):
+    """Train an agent headless, without rendering or frame limiting.
+
+    Games are played on a ``width`` x ``height`` board (in cells). With a
+    ``seed``, the food, exploration and replay sampling streams are all
+    derived from it, so the run can be reproduced exactly.
+    """
+    agent_data = load_agent(agent_name)
+    if not agent_data:
+        return None
+    encoder_id = agent_encoder_id(agent_data)
+    load_q_table(agent_name, encoder_id, agent_actions(agent_data))
+
+    seeds = random.Random(seed)
+    env = SnakeEnv(seeds.getrandbits(64), width, height, get_encoder(encoder_id))
+    rng = random.Random(seeds.getrandbits(64))
+    checkpointer = Checkpointer(agent_data)
+    replay = make_replay_buffer(agent_data, seeds.getrandbits(64))
+    scores = []
+    for _ in range(episodes):
+        score = play_episode(env, agent_data, "learning", replay=replay, rng=rng)
+        finish_episode(agent_data, env, checkpointer, "learning")
+        scores.append(score)
+    checkpointer.save(final=True)
 
     print("Learning session completed!")
+    return scores
+
+
+def rl_main(agent_name, mode="learning"):
+    """Watch an agent play (and learn) in the pygame window.
+
+    Set the SNAKE_PROFILE environment variable to a path to profile the
+    session and write the report there as JSON.
+    """
+    global PROFILER
+    # pygame is only needed to watch; importing it here keeps the training
+    # code usable on machines without it
+    from game_objects import BoardRenderer, clock
+
+    agent_data = load_agent(agent_name)
+    if not agent_data:
+        return
+    encoder_id = agent_encoder_id(agent_data)
+    load_q_table(agent_name, encoder_id, agent_actions(agent_data))
+
+    # Ask for the number of games in the Pygame window
+    num_games = 1
+    if mode == "learning":
+        num_games = display_text_input("Enter the number of games to run:", 1)
+
+    learning_speed = 100  # Speed for accelerated training
+
+    profile_path = os.environ.get("SNAKE_PROFILE")
+    if profile_path:
+        PROFILER = Profiler()
+
+    env = SnakeEnv(encoder=get_encoder(encoder_id))
+    checkpointer = Checkpointer(agent_data)
+    replay = make_replay_buffer(agent_data) if mode == "learning" else None
+    for game_num in range(1, num_games + 1):
+        renderer = BoardRenderer(env.width, env.height)
+        session_text = f"Session: {game_num}/{num_games}"
+
+        def render(env):
+            # Render the game in learning mode at accelerated speed, with the
+            # score and session number on top
+            start = time.perf_counter()
+            renderer.draw(
+                env.snake_body,
+                env.food_pos,
+                [(f"Score: {env.score}", (10, 10)), (session_text, (10, 40))],
+            )
+            if PROFILER:
+                start = PROFILER.lap("render", start)
+            clock.tick(learning_speed if mode == "learning" else 10)
+            if PROFILER:
+                PROFILER.lap("clock_tick", start)
+
+        play_episode(env, agent_data, mode, on_step=render, replay=replay)
+        finish_episode(agent_data, env, checkpointer, mode)
+    checkpointer.save(final=True)
+
+    print("Learning session completed!")
+    if profile_path:
+        print(PROFILER.format_report())
+        PROFILER.dump_json(profile_path)
+        PROFILER = None
 
 
 def display_text_input(prompt, default_value):
     """Displays an input prompt on the screen and returns user input or a default value."""
+    import pygame
+    from game_objects import (
+        black,
+        clock,
+        get_font,
+        render_text,
+        screen,
+        screen_height,
+        screen_width,
+        white,
+    )
+
     input_text = ""
     active = True
-    font = pygame.font.Font("freesansbold.ttf", 24)
+    font = get_font(24)
     input_box = pygame.Rect(screen_width // 2 - 100, screen_height // 2, 200, 40)
 
     while active:
         screen.fill(black)
-        prompt_text = font.render(prompt, True, white)
-        default_text = font.render(f"Default: {default_value}", True, white)
+        prompt_text = render_text(prompt, 24, white)
+        default_text = render_text(f"Default: {default_value}", 24, white)
         screen.blit(
             prompt_text,
             (screen_width // 2 - prompt_text.get_width() // 2, screen_height // 2 - 50),
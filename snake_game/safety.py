@@ -0,0 +1,139 @@
+# safety.py
+#
+# Look-ahead for moves that trap the snake. ``is_danger_*`` only sees the
+# cell next to the head; a move into an open cell can still seal the head
+# into a pocket too small to live in. For a candidate move, a breadth-first
+# search from the new head over the free cells tells whether the snake can
+# still reach its tail (and so follow it out) or has room for its whole
+# length. Agents use it as an action mask ("safety_mask" in their JSON) or as
+# state features (the "safety" encoder in state_encoders.py).
+
+from directions import DELTAS, STEPS
+
+# (width, height) -> the neighbouring cells of every cell of such a board
+_neighbours = {}
+
+
+def board_neighbours(width, height):
+    """For every flat cell ``y * width + x``, the tuple of its neighbours."""
+    neighbours = _neighbours.get((width, height))
+    if neighbours is None:
+        neighbours = _neighbours[(width, height)] = []
+        for y in range(height):
+            for x in range(width):
+                cell = y * width + x
+                neighbours.append(
+                    tuple(
+                        cell + dy * width + dx
+                        for dx, dy in DELTAS
+                        if 0 <= x + dx < width and 0 <= y + dy < height
+                    )
+                )
+    return neighbours
+
+
+def _search(env, action, limit):
+    # (area, tail_reachable, seen) for action_safety; ``seen`` marks the
+    # cells visited, or is None if the move dies at once
+    width, height = env.width, env.height
+    body = env.snake_body
+    dx, dy = DELTAS[STEPS[env.heading][action]]
+    x, y = env.snake_pos[0] + dx, env.snake_pos[1] + dy
+    if not (0 <= x < width and 0 <= y < height):
+        return 0, False, None
+    index = body.free_cells.index
+    start = y * width + x
+    tail_x, tail_y = body.tail
+    tail = tail_y * width + tail_x
+    if start == tail:
+        return 1, True, None
+    if index[start] < 0:
+        return 0, False, None
+
+    neighbours = board_neighbours(width, height)
+    seen = bytearray(width * height)
+    seen[start] = 1
+    queue = [start]
+    area = 0
+    for cell in queue:  # The queue grows while it's walked
+        area += 1
+        if area >= limit:
+            return area, False, seen
+        for neighbour in neighbours[cell]:
+            if seen[neighbour]:
+                continue
+            if neighbour == tail:
+                return area, True, seen
+            seen[neighbour] = 1
+            if index[neighbour] >= 0:
+                queue.append(neighbour)
+    return area, False, seen
+
+
+def _target_cell(env, action):
+    dx, dy = DELTAS[STEPS[env.heading][action]]
+    x, y = env.snake_pos[0] + dx, env.snake_pos[1] + dy
+    if 0 <= x < env.width and 0 <= y < env.height:
+        return y * env.width + x
+    return None
+
+
+def action_safety(env, action, limit=None):
+    """``(area, tail_reachable)`` after moving the head one cell by ``action``.
+
+    ``action`` may be absolute or relative to the heading.
+
+    Searches the free cells reachable from the new head and stops early as
+    soon as it reaches the tail or has counted ``limit`` cells (the snake's
+    length by default), so ``area`` is only a lower bound, and the move is
+    safe exactly when ``tail_reachable or area >= limit``. A move into the
+    wall or the body gives ``(0, False)``.
+
+    Occupancy is read from the env's FreeCells index, which the snake body
+    keeps up to date move by move, so nothing is rebuilt per call. The tail
+    cell itself is a valid target: the tail moves off it as the head moves.
+    """
+    if limit is None:
+        limit = len(env.snake_body)
+    area, tail_reachable, _ = _search(env, action, limit)
+    return area, tail_reachable
+
+
+def is_safe(env, action):
+    area, tail_reachable = action_safety(env, action)
+    return tail_reachable or area >= len(env.snake_body)
+
+
+def safe_actions(env, actions):
+    """The ``actions`` that don't trap the snake.
+
+    If every one of them does, the ones with the most room, so the snake
+    lives as long as it can; if all of them die at once, ``actions``.
+
+    The candidate cells all neighbour the head and usually share one free
+    region, so a move onto a free cell an earlier search already reached
+    reuses that search's answer instead of searching again.
+    """
+    limit = len(env.snake_body)
+    index = env.snake_body.free_cells.index
+    searches = []
+    areas = {}
+    for action in actions:
+        cell = _target_cell(env, action)
+        free = cell is not None and index[cell] >= 0
+        for seen, area, tail_reachable in searches:
+            # Searches also mark the occupied cells they bump into
+            if free and seen[cell]:
+                break
+        else:
+            area, tail_reachable, seen = _search(env, action, limit)
+            if seen is not None:
+                searches.append((seen, area, tail_reachable))
+        areas[action] = None if tail_reachable or area >= limit else area
+    safe = [action for action in actions if areas[action] is None]
+    if safe:
+        return safe
+    most = max(areas.values())
+    if not most:
+        return list(actions)
+    return [action for action in actions if areas[action] == most]
@@ -7,12 +7,13 @@ import os
 import json
 from datetime import datetime
 from game_objects import (
+    BoardRenderer,
+    get_font,
+    render_text,
     screen,
     screen_width,
     screen_height,
     clock,
-    draw_snake,
-    draw_food,
     black,
     white,
     green,
@@ -20,6 +21,21 @@ from game_objects import (
 )
 from rl_agent import rl_main, list_agents, create_agent, display_text_input
 from high_score_utils import read_high_scores, update_high_scores
+from directions import DELTAS, DOWN, LEFT, OPPOSITE, RIGHT, UP
+from snake_env import (
+    is_collision,
+    new_snake_body,
+    random_food_pos,
+    start_body,
+)
+
+# Arrow key -> heading
+KEY_HEADINGS = {
+    pygame.K_UP: UP,
+    pygame.K_DOWN: DOWN,
+    pygame.K_LEFT: LEFT,
+    pygame.K_RIGHT: RIGHT,
+}
 
 # Initialize Pygame
 pygame.init()
@@ -31,29 +47,27 @@ HIGH_SCORES_FILE = "high_scores.json"
 def view_high_scores():
     high_scores = read_high_scores()
     screen.fill(black)
-    font = pygame.font.Font("freesansbold.ttf", 32)
-    title_text = font.render("High Scores", True, white)
+    title_text = render_text("High Scores", 32, white)
     screen.blit(title_text, (screen_width // 2 - title_text.get_width() // 2, 50))
 
     if high_scores:
         y_offset = 120
-        score_font = pygame.font.Font("freesansbold.ttf", 28)
         for i, entry in enumerate(high_scores, start=1):
-            score_text = score_font.render(
-                f"{i}. {entry['name']} - {entry['score']}", True, white
+            score_text = render_text(
+                f"{i}. {entry['name']} - {entry['score']}", 28, white
             )
             screen.blit(
                 score_text, (screen_width // 2 - score_text.get_width() // 2, y_offset)
             )
             y_offset += 40
     else:
-        no_scores_text = font.render("No high scores yet!", True, white)
+        no_scores_text = render_text("No high scores yet!", 32, white)
         screen.blit(
             no_scores_text, (screen_width // 2 - no_scores_text.get_width() // 2, 150)
         )
 
     # Prompt to return to the landing screen
-    prompt_text = font.render("Press Enter to Return", True, white)
+    prompt_text = render_text("Press Enter to Return", 32, white)
     screen.blit(
         prompt_text,
         (screen_width // 2 - prompt_text.get_width() // 2, screen_height - 100),
@@ -76,8 +90,7 @@ def view_high_scores():
 def game_over(score):
     # Display the "Game Over" message
     screen.fill(black)
-    font = pygame.font.Font("freesansbold.ttf", 32)
-    game_over_text = font.render("Game Over! Enter Your Name:", True, red)
+    game_over_text = render_text("Game Over! Enter Your Name:", 32, red)
     screen.blit(
         game_over_text, (screen_width // 2 - game_over_text.get_width() // 2, 50)
     )
@@ -86,7 +99,7 @@ def game_over(score):
     # Capture name input
     input_active = True
     player_name = ""
-    input_font = pygame.font.Font("freesansbold.ttf", 32)
+    input_font = get_font(32)
     input_box = pygame.Rect(screen_width // 2 - 100, 100, 200, 40)
 
     while input_active:
@@ -124,21 +137,15 @@ def game_over(score):
 
     high_scores = read_high_scores()
     y_offset = 160
-    font = pygame.font.Font("freesansbold.ttf", 24)
     for i, entry in enumerate(high_scores, start=1):
-        score_text = font.render(
-            f"{i}. {entry['name']} - {entry['score']}", True, white
-        )
+        score_text = render_text(f"{i}. {entry['name']} - {entry['score']}", 24, white)
         screen.blit(
             score_text, (screen_width // 2 - score_text.get_width() // 2, y_offset)
         )
         y_offset += 30
 
     # Display "Press Enter to Play Again or ESC to Quit"
-    font = pygame.font.Font("freesansbold.ttf", 28)
-    play_again_text = font.render(
-        "Press Enter to Play Again or ESC to Quit", True, white
-    )
+    play_again_text = render_text("Press Enter to Play Again or ESC to Quit", 28, white)
     screen.blit(
         play_again_text,
         (screen_width // 2 - play_again_text.get_width() // 2, y_offset + 20),
@@ -164,11 +171,10 @@ def game_over(score):
 
 def landing_screen():
     screen.fill(black)
-    font = pygame.font.Font("freesansbold.ttf", 32)
-    title_text = font.render("Welcome to Snake Game", True, white)
-    option1_text = font.render("Press 1 to Play Yourself", True, white)
-    option2_text = font.render("Press 2 for Agent Options", True, white)
-    option3_text = font.render("Press 3 to View High Scores", True, white)
+    title_text = render_text("Welcome to Snake Game", 32, white)
+    option1_text = render_text("Press 1 to Play Yourself", 32, white)
+    option2_text = render_text("Press 2 for Agent Options", 32, white)
+    option3_text = render_text("Press 3 to View High Scores", 32, white)
 
     screen.blit(title_text, (screen_width // 2 - title_text.get_width() // 2, 80))
     screen.blit(option1_text, (screen_width // 2 - option1_text.get_width() // 2, 180))
@@ -198,33 +204,28 @@ def agent_options_screen():
 
     while True:
         screen.fill(black)
-        font = pygame.font.Font("freesansbold.ttf", 28)
-        title_text = font.render("Agent Options", True, white)
+        title_text = render_text("Agent Options", 28, white)
         screen.blit(title_text, (screen_width // 2 - title_text.get_width() // 2, 50))
 
         if agents:
             for i, agent in enumerate(agents, start=1):
-                agent_text = font.render(f"{i}. {agent}", True, white)
+                agent_text = render_text(f"{i}. {agent}", 28, white)
                 screen.blit(agent_text, (100, 100 + i * 40))
-            create_agent_text = font.render(
-                "Press C to Create a New Agent", True, white
-            )
+            create_agent_text = render_text("Press C to Create a New Agent", 28, white)
             screen.blit(create_agent_text, (100, 100 + (len(agents) + 2) * 40))
         else:
-            no_agents_text = font.render("No Agents Found", True, white)
+            no_agents_text = render_text("No Agents Found", 28, white)
             screen.blit(
                 no_agents_text,
                 (screen_width // 2 - no_agents_text.get_width() // 2, 150),
             )
-            create_agent_text = font.render(
-                "Press C to Create a New Agent", True, white
-            )
+            create_agent_text = render_text("Press C to Create a New Agent", 28, white)
             screen.blit(
                 create_agent_text,
                 (screen_width // 2 - create_agent_text.get_width() // 2, 200),
             )
 
-        back_text = font.render("Press B to Go Back", True, white)
+        back_text = render_text("Press B to Go Back", 28, white)
         screen.blit(
             back_text,
             (screen_width // 2 - back_text.get_width() // 2, screen_height - 50),
@@ -283,11 +284,10 @@ def agent_options_screen():
 def mode_selection_screen():
     while True:
         screen.fill(black)
-        font = pygame.font.Font("freesansbold.ttf", 32)
-        title_text = font.render("Select Mode", True, white)
-        option1_text = font.render("Press L for Learning Mode", True, white)
-        option2_text = font.render("Press S for Static Mode", True, white)
-        back_text = font.render("Press B to Go Back", True, white)
+        title_text = render_text("Select Mode", 32, white)
+        option1_text = render_text("Press L for Learning Mode", 32, white)
+        option2_text = render_text("Press S for Static Mode", 32, white)
+        back_text = render_text("Press B to Go Back", 32, white)
 
         screen.blit(title_text, (screen_width // 2 - title_text.get_width() // 2, 100))
         screen.blit(
@@ -317,12 +317,12 @@ def mode_selection_screen():
 def text_input_screen(prompt):
     input_text = ""
     active = True
-    font = pygame.font.Font("freesansbold.ttf", 32)
+    font = get_font(32)
     input_box = pygame.Rect(screen_width // 2 - 100, screen_height // 2, 200, 40)
 
     while active:
         screen.fill(black)
-        prompt_text = font.render(prompt, True, white)
+        prompt_text = render_text(prompt, 32, white)
         screen.blit(
             prompt_text,
             (screen_width // 2 - prompt_text.get_width() // 2, screen_height // 2 - 50),
@@ -352,20 +352,22 @@ def text_input_screen(prompt):
         clock.tick(30)
 
 
-def main():
+def main(seed=None):
     global snake_pos, snake_body, snake_direction, change_to, food_pos, food_spawn, score
 
+    # Food positions come from this game's own RNG, so a seed reproduces them
+    food_rng = random.Random(seed)
+
     # Initialize variables
-    snake_pos = [100, 50]
-    snake_body = [[100, 50], [90, 50], [80, 50]]
-    snake_direction = "RIGHT"
+    blocks = start_body()
+    snake_pos = list(blocks[0])
+    snake_body = new_snake_body(blocks)
+    snake_direction = RIGHT
     change_to = snake_direction
-    food_pos = [
-        random.randrange(1, (screen_width // 10)) * 10,
-        random.randrange(1, (screen_height // 10)) * 10,
-    ]
+    food_pos = random_food_pos(snake_body, food_rng)
     food_spawn = True
     score = 0
+    renderer = BoardRenderer()
 
     while True:
         for event in pygame.event.get():
@@ -373,75 +375,40 @@ def main():
                 pygame.quit()
                 sys.exit()
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP and not (snake_direction == "DOWN"):
-                    change_to = "UP"
-                elif event.key == pygame.K_DOWN and not (snake_direction == "UP"):
-                    change_to = "DOWN"
-                elif event.key == pygame.K_LEFT and not (snake_direction == "RIGHT"):
-                    change_to = "LEFT"
-                elif event.key == pygame.K_RIGHT and not (snake_direction == "LEFT"):
-                    change_to = "RIGHT"
+                heading = KEY_HEADINGS.get(event.key)
+                if heading is not None and heading != OPPOSITE[snake_direction]:
+                    change_to = heading
 
         # Ensure the snake does not move in the opposite direction instantaneously
-        if change_to == "UP" and snake_direction != "DOWN":
-            snake_direction = "UP"
-        if change_to == "DOWN" and snake_direction != "UP":
-            snake_direction = "DOWN"
-        if change_to == "LEFT" and snake_direction != "RIGHT":
-            snake_direction = "LEFT"
-        if change_to == "RIGHT" and snake_direction != "LEFT":
-            snake_direction = "RIGHT"
+        if change_to != OPPOSITE[snake_direction]:
+            snake_direction = change_to
 
         # Move the snake in the specified direction
-        if snake_direction == "UP":
-            snake_pos[1] -= 10
-        if snake_direction == "DOWN":
-            snake_pos[1] += 10
-        if snake_direction == "LEFT":
-            snake_pos[0] -= 10
-        if snake_direction == "RIGHT":
-            snake_pos[0] += 10
+        dx, dy = DELTAS[snake_direction]
+        snake_pos[0] += dx
+        snake_pos[1] += dy
 
         # Snake body growing mechanism
-        snake_body.insert(0, list(snake_pos))
         if snake_pos[0] == food_pos[0] and snake_pos[1] == food_pos[1]:
             score += 1
             food_spawn = False
-        else:
-            snake_body.pop()
+        snake_body.move(snake_pos, grow=not food_spawn)
 
         if not food_spawn:
-            food_pos = [
-                random.randrange(1, (screen_width // 10)) * 10,
-                random.randrange(1, (screen_height // 10)) * 10,
-            ]
+            food_pos = random_food_pos(snake_body, food_rng)
         food_spawn = True
 
         # Game Over conditions
-        if (
-            snake_pos[0] < 0
-            or snake_pos[0] >= screen_width
-            or snake_pos[1] < 0
-            or snake_pos[1] >= screen_height
-        ):
+        if is_collision(snake_pos, snake_body):
+            game_over(score)
+            return
+        if food_pos is None:
+            # The snake fills the board
             game_over(score)
             return
-        for block in snake_body[1:]:
-            if snake_pos[0] == block[0] and snake_pos[1] == block[1]:
-                game_over(score)
-                return
-
-        # Display background and elements
-        screen.fill(black)
-        draw_snake(snake_body)
-        draw_food(food_pos)
-
-        # Show score during gameplay
-        font = pygame.font.Font("freesansbold.ttf", 24)
-        score_text = font.render(f"Score: {score}", True, white)
-        screen.blit(score_text, (10, 10))
 
-        pygame.display.update()
+        # Display the board, showing the score during gameplay
+        renderer.draw(snake_body, food_pos, [(f"Score: {score}", (10, 10))])
         clock.tick(10)
 
 
@@ -0,0 +1,94 @@
+# snake_body.py
+
+import random
+from collections import deque
+
+# Random 64-bit keys per cell for Zobrist hashing, created on first use; a
+# fixed seed keeps position keys the same from run to run
+_cell_keys = {}
+_key_rng = random.Random(0)
+
+
+def cell_key(point):
+    key = _cell_keys.get(point)
+    if key is None:
+        key = _cell_keys[point] = _key_rng.getrandbits(64)
+    return key
+
+
+class SnakeBody:
+    """The snake's blocks, head first, with O(1) moves and collision checks.
+
+    The blocks are kept in a deque so the head can be pushed and the tail
+    popped in constant time, and mirrored in a dict of occupancy counts so
+    asking whether a point is covered by the body doesn't scan the whole
+    snake. Points are ``(x, y)`` tuples; lists are accepted on input.
+
+    If given a FreeCells index, cells are marked occupied and released in it
+    as the snake covers and uncovers them, so the food can be placed on a
+    random empty cell in O(1).
+
+    ``key`` is a Zobrist hash of the covered cells (the XOR of their
+    ``cell_key``), kept up to date in O(1) per move.
+    """
+
+    def __init__(self, blocks, free_cells=None):
+        self._blocks = deque()
+        self._occupied = {}
+        self.free_cells = free_cells
+        self.key = 0
+        for block in reversed(blocks):
+            self.push_head(block)
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def __iter__(self):
+        return iter(self._blocks)
+
+    def __contains__(self, point):
+        return (point[0], point[1]) in self._occupied
+
+    @property
+    def head(self):
+        return self._blocks[0]
+
+    @property
+    def tail(self):
+        return self._blocks[-1]
+
+    def push_head(self, point):
+        point = (point[0], point[1])
+        self._blocks.appendleft(point)
+        count = self._occupied.get(point, 0)
+        self._occupied[point] = count + 1
+        if not count:
+            self.key ^= cell_key(point)
+            if self.free_cells is not None:
+                self.free_cells.occupy(point)
+
+    def pop_tail(self):
+        point = self._blocks.pop()
+        count = self._occupied[point] - 1
+        if count:
+            self._occupied[point] = count
+        else:
+            del self._occupied[point]
+            self.key ^= cell_key(point)
+            if self.free_cells is not None:
+                self.free_cells.release(point)
+        return point
+
+    def move(self, point, grow=False):
+        """Advance the head to ``point``, dropping the tail unless growing."""
+        self.push_head(point)
+        if not grow:
+            self.pop_tail()
+
+    def collides(self, point):
+        """Whether ``point`` is on the body behind the head (``body[1:]``)."""
+        point = (point[0], point[1])
+        count = self._occupied.get(point, 0)
+        if count and point == self._blocks[0]:
+            count -= 1
+        return count > 0
@@ -0,0 +1,246 @@
+# snake_env.py
+#
+# Pure-Python snake simulation. Nothing in here touches pygame, so it can be
+# stepped as fast as the CPU allows on machines without a display.
+
+import random
+import time
+
+from directions import (
+    DELTAS,
+    DIRECTIONS,
+    HEADINGS,
+    LOOKAHEAD,
+    MOVING,
+    RIGHT,
+    STEPS,
+    TURN_LEFT,
+    TURN_RIGHT,
+)
+from free_cells import FreeCells
+from snake_body import SnakeBody
+
+# Default board size, in grid cells. All game logic works in integer cell
+# coordinates; pixels only exist in the renderer (game_objects.py)
+board_width = 64
+board_height = 48
+
+ACTIONS = list(DIRECTIONS)
+
+
+def is_collision(point, snake_body, width=board_width, height=board_height):
+    # Check if the point is hitting the wall
+    if point[0] < 0 or point[0] >= width or point[1] < 0 or point[1] >= height:
+        return True
+    # Check if the point is hitting itself
+    if snake_body.collides(point):
+        return True
+    return False
+
+
+def _is_danger(snake_pos, snake_body, heading, width, height):
+    dx, dy = DELTAS[heading]
+    return is_collision(
+        (snake_pos[0] + dx, snake_pos[1] + dy), snake_body, width, height
+    )
+
+
+def is_danger_straight(
+    snake_pos, snake_body, snake_direction, width=board_width, height=board_height
+):
+    heading = HEADINGS[snake_direction]
+    return _is_danger(snake_pos, snake_body, heading, width, height)
+
+
+def is_danger_left(
+    snake_pos, snake_body, snake_direction, width=board_width, height=board_height
+):
+    heading = TURN_LEFT[HEADINGS[snake_direction]]
+    return _is_danger(snake_pos, snake_body, heading, width, height)
+
+
+def is_danger_right(
+    snake_pos, snake_body, snake_direction, width=board_width, height=board_height
+):
+    heading = TURN_RIGHT[HEADINGS[snake_direction]]
+    return _is_danger(snake_pos, snake_body, heading, width, height)
+
+
+def get_state(
+    snake_pos,
+    snake_body,
+    food_pos,
+    snake_direction,
+    width=board_width,
+    height=board_height,
+):
+    """The 11 basic features; ``snake_direction`` is a heading name or int."""
+    heading = HEADINGS[snake_direction]
+    x, y = snake_pos
+    (sx, sy), (lx, ly), (rx, ry) = LOOKAHEAD[heading]
+
+    # Danger indicators
+    danger_straight = is_collision((x + sx, y + sy), snake_body, width, height)
+    danger_left = is_collision((x + lx, y + ly), snake_body, width, height)
+    danger_right = is_collision((x + rx, y + ry), snake_body, width, height)
+
+    # Food direction
+    food_left = food_pos[0] < x
+    food_right = food_pos[0] > x
+    food_up = food_pos[1] < y
+    food_down = food_pos[1] > y
+
+    # Snake movement direction
+    moving_left, moving_right, moving_up, moving_down = MOVING[heading]
+
+    state = (
+        danger_straight,
+        danger_left,
+        danger_right,
+        moving_left,
+        moving_right,
+        moving_up,
+        moving_down,
+        food_left,
+        food_right,
+        food_up,
+        food_down,
+    )
+    return state
+
+
+def random_food_pos(snake_body, rng=random):
+    """A random empty cell for the food, or None if the snake fills the board."""
+    return snake_body.free_cells.sample(rng)
+
+
+def start_body(width=board_width, height=board_height):
+    """The starting snake, head first, heading right.
+
+    On the default board the head starts at cell (10, 5); smaller boards
+    start nearer the middle so the snake isn't born against a wall.
+    """
+    x, y = min(10, max(2, width // 2)), min(5, height // 2)
+    return [[x, y], [x - 1, y], [x - 2, y]]
+
+
+def new_snake_body(blocks, width=board_width, height=board_height):
+    """A SnakeBody that keeps a FreeCells index of the rest of the board."""
+    return SnakeBody(blocks, FreeCells(width, height))
+
+
+class SnakeEnv:
+    """A single game of snake with a reset/step interface.
+
+    ``step`` takes one of "UP", "DOWN", "LEFT" or "RIGHT", or a relative
+    "STRAIGHT", "TURN_LEFT" or "TURN_RIGHT", and returns
+    ``(next_state, reward, done)`` where the reward is the raw game reward
+    (10 for food, -0.1 for a plain move, -100 for dying). Once ``done``,
+    ``end_reason`` says why: "wall", "self" or "won". The snake's heading is
+    ``heading``, an int from directions.py.
+
+    The board is ``width`` x ``height`` cells and positions are ``[x, y]``
+    cell coordinates, so a step costs the same at any board size.
+
+    Randomness comes only from the env's own RNG streams, never the global
+    ``random`` module. Every episode gets a 32-bit ``episode_seed`` (drawn
+    from a stream seeded with ``seed``, or given to ``reset``) that fully
+    determines its food positions, so the seed plus the actions taken replay
+    the game exactly.
+
+    With a ``profiler`` (see profiler.py) set, ``step`` times its move and
+    collision check and the state extraction as separate phases.
+
+    States come from ``encoder`` (see state_encoders.py) if given, else from
+    ``get_state``.
+    """
+
+    profiler = None
+
+    def __init__(self, seed=None, width=board_width, height=board_height, encoder=None):
+        if width < 3 or height < 1:
+            raise ValueError(f"Board must be at least 3x1 cells, got {width}x{height}")
+        self.width = width
+        self.height = height
+        self.encoder = encoder
+        self.seed_rng = random.Random(seed)
+        self.reset()
+
+    def reset(self, seed=None):
+        if seed is None:
+            seed = self.seed_rng.getrandbits(32)
+        self.episode_seed = seed
+        self.rng = random.Random(seed)
+
+        blocks = start_body(self.width, self.height)
+        self.snake_pos = list(blocks[0])
+        self.snake_body = new_snake_body(blocks, self.width, self.height)
+        self.heading = RIGHT
+        self.food_pos = random_food_pos(self.snake_body, self.rng)
+        self.score = 0
+        self.steps = 0
+        self.done = False
+        self.end_reason = None
+        return self.get_state()
+
+    @property
+    def snake_direction(self):
+        """The heading's name; ``heading`` is the int (see directions.py)."""
+        return DIRECTIONS[self.heading]
+
+    def get_state(self):
+        if self.encoder is not None:
+            return self.encoder.encode(self)
+        return get_state(
+            self.snake_pos,
+            self.snake_body,
+            self.food_pos,
+            self.heading,
+            self.width,
+            self.height,
+        )
+
+    def step(self, action):
+        profiler = self.profiler
+        if profiler:
+            start = time.perf_counter()
+        self.heading = heading = STEPS[self.heading][action]
+
+        # Move the snake
+        dx, dy = DELTAS[heading]
+        self.snake_pos[0] += dx
+        self.snake_pos[1] += dy
+
+        # Update the snake body, growing it if the food was eaten
+        ate = self.snake_pos == self.food_pos
+        self.snake_body.move(self.snake_pos, grow=ate)
+
+        if ate:
+            self.score += 1
+            reward = 10  # Reward for eating food
+            food_pos = random_food_pos(self.snake_body, self.rng)
+            if food_pos is None:
+                # The snake fills the board: nothing left to eat, the game is
+                # won. The food stays where it was eaten, under the head
+                self.done = True
+                self.end_reason = "won"
+            else:
+                self.food_pos = food_pos
+        else:
+            reward = -0.1  # Penalty for movement without food
+
+        # Check for game over conditions
+        if is_collision(self.snake_pos, self.snake_body, self.width, self.height):
+            reward = -100  # Penalty for dying
+            self.done = True
+            x, y = self.snake_pos
+            inside = 0 <= x < self.width and 0 <= y < self.height
+            self.end_reason = "self" if inside else "wall"
+
+        self.steps += 1
+        if profiler:
+            start = profiler.lap("move_collision", start)
+        state = self.get_state()
+        if profiler:
+            profiler.lap("get_state", start)
+        return state, reward, self.done
@@ -0,0 +1,162 @@
+# state_encoders.py
+#
+# The ways an env can be turned into the state the Q-table is indexed by.
+# Every encoder has an id; an agent names its encoder in its JSON
+# ("state_encoder", "basic" when absent) and its Q-table records the id too,
+# so a table learnt on one state format is never read with another.
+#
+# A state is a tuple of booleans, packed into an int by q_table.encode_state.
+# The episode log and the replay buffer store packed states as 16-bit ints,
+# so an encoder has at most MAX_FEATURES features.
+
+from directions import TURNS
+from safety import is_safe
+from snake_env import get_state
+
+MAX_FEATURES = 16
+DEFAULT_ENCODER = "basic"
+
+# Encoder id -> encoder
+ENCODERS = {}
+
+
+def register_encoder(cls):
+    """Class decorator adding an encoder (one shared instance) to ENCODERS."""
+    if cls.num_features > MAX_FEATURES:
+        raise ValueError(f"Encoder {cls.id!r} has more than {MAX_FEATURES} features")
+    ENCODERS[cls.id] = cls()
+    return cls
+
+
+def get_encoder(encoder_id):
+    try:
+        return ENCODERS[encoder_id]
+    except KeyError:
+        raise ValueError(f"Unknown state encoder {encoder_id!r}") from None
+
+
+def agent_encoder_id(agent_data):
+    return agent_data.get("state_encoder", DEFAULT_ENCODER)
+
+
+@register_encoder
+class BasicEncoder:
+    """``snake_env.get_state``: danger one cell straight, left and right, the
+    direction of movement and the direction of the food."""
+
+    id = "basic"
+    num_features = 11
+
+    def encode(self, env):
+        return get_state(
+            env.snake_pos,
+            env.snake_body,
+            env.food_pos,
+            env.heading,
+            env.width,
+            env.height,
+        )
+
+
+@register_encoder
+class SafetyEncoder(BasicEncoder):
+    """The basic features plus whether going straight, turning left and
+    turning right each trap the snake (see safety.py)."""
+
+    id = "safety"
+    num_features = 11 + 3
+
+    def encode(self, env):
+        return super().encode(env) + tuple(
+            not is_safe(env, action) for action in TURNS[env.heading]
+        )
+
+
+# Rays run N, E, S, W, then NE, SE, SW, NW, as (dx, dy)
+RAY_DIRECTIONS = [(0, -1), (1, 0), (0, 1), (-1, 0), (1, -1), (1, 1), (-1, 1), (-1, -1)]
+# How far a ray looks for the body; the wall is seen at any distance
+RAY_RANGE = 4
+
+
+@register_encoder
+class RayEncoder:
+    """Distance from the head to the wall or the body along 8 rays.
+
+    For each orthogonal ray: is the nearest obstacle adjacent, and is it
+    within RAY_RANGE cells. For each diagonal ray: is it adjacent. Then the
+    direction of the food, as in the basic encoder. The heading isn't a
+    feature; the neck always sits on the ray behind the head.
+
+    Rays walk the occupancy grid the env's FreeCells index already keeps up
+    to date move by move (``index[cell] < 0`` when covered), so a state
+    costs at most RAY_RANGE lookups per ray at any snake length. How far
+    each cell is from the wall along each ray is computed once per board
+    size.
+    """
+
+    id = "rays8"
+    num_features = 12 + 4
+
+    def __init__(self):
+        self._rays = {}
+
+    def rays(self, width, height):
+        """``(flat step, cells ahead before the wall per cell)`` per ray."""
+        rays = self._rays.get((width, height))
+        if rays is None:
+            rays = self._rays[(width, height)] = []
+            for dx, dy in RAY_DIRECTIONS:
+                ahead = []
+                for y in range(height):
+                    for x in range(width):
+                        limits = []
+                        if dx:
+                            limits.append(width - 1 - x if dx > 0 else x)
+                        if dy:
+                            limits.append(height - 1 - y if dy > 0 else y)
+                        ahead.append(min(limits))
+                rays.append((dy * width + dx, ahead))
+        return rays
+
+    def distances(self, env):
+        """Distance to the first obstacle along each ray (1 = adjacent)."""
+        width, height = env.width, env.height
+        x, y = env.snake_pos
+        if not (0 <= x < width and 0 <= y < height):
+            return [1] * len(RAY_DIRECTIONS)
+        index = env.snake_body.free_cells.index
+        cell = y * width + x
+        distances = []
+        for step, ahead in self.rays(width, height):
+            free = ahead[cell]
+            distance = free + 1  # The wall
+            target = cell
+            for k in range(1, min(free, RAY_RANGE) + 1):
+                target += step
+                if index[target] < 0:
+                    distance = k
+                    break
+            distances.append(distance)
+        return distances
+
+    def encode(self, env):
+        n, e, s, w, ne, se, sw, nw = self.distances(env)
+        (x, y), (food_x, food_y) = env.snake_pos, env.food_pos
+        return (
+            n == 1,
+            n <= RAY_RANGE,
+            e == 1,
+            e <= RAY_RANGE,
+            s == 1,
+            s <= RAY_RANGE,
+            w == 1,
+            w <= RAY_RANGE,
+            ne == 1,
+            se == 1,
+            sw == 1,
+            nw == 1,
+            food_x < x,
+            food_x > x,
+            food_y < y,
+            food_y > y,
+        )
@@ -0,0 +1,320 @@
+# sweep.py
+#
+# Headless hyperparameter search. A search space is a JSON file mapping agent
+# parameters to the values to try, either a list or a range to sample from:
+#
+#     {"learning_rate": [0.05, 0.1, 0.2],
+#      "discount_factor": {"min": 0.8, "max": 0.99},
+#      "exploration_decay": {"min": 0.99, "max": 0.9999, "log": true}}
+#
+# Parameters left out keep the defaults of the agent creation screen. Every
+# configuration is trained once per seed of a fixed set, each run as its own
+# agent, on a process pool, then judged by its mean greedy score over the
+# same evaluation games:
+#
+#     python snake_game/sweep.py space.json --search random --trials 27 \
+#         --episodes 100 --rungs 3 --eta 3 --seeds 0 1 2 --output sweep.json
+#
+# With ``--rungs`` above 1 the search is a successive halving: after each
+# rung only the best 1/eta of the configurations train on, for eta times as
+# many episodes in total, so poor ones stop early.
+
+import argparse
+import csv
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+
+import numpy as np
+
+import rl_agent
+from evaluate import evaluate
+from snake_env import board_height, board_width
+
+# Parameter -> default, as prompted for on the agent creation screen
+SWEEP_PARAMS = {
+    "learning_rate": 0.2,
+    "discount_factor": 0.8,
+    "exploration_rate": 0.9,
+    "exploration_decay": 0.895,
+    "min_exploration_rate": 0.1,
+}
+
+
+def read_space(path):
+    with open(path, "r") as f:
+        space = json.load(f)
+    for name, spec in space.items():
+        if name not in SWEEP_PARAMS:
+            raise ValueError(f"Unknown sweep parameter {name!r}")
+        if isinstance(spec, dict):
+            if "min" not in spec or "max" not in spec:
+                raise ValueError(f"Range for {name!r} needs a min and a max")
+            if spec.get("log") and spec["min"] <= 0:
+                raise ValueError(f"Log range for {name!r} must be positive")
+        elif not isinstance(spec, list) or not spec:
+            raise ValueError(f"{name!r} must be a list of values or a range")
+    return space
+
+
+def grid_configs(space):
+    """Every combination of the listed values."""
+    for name, spec in space.items():
+        if isinstance(spec, dict):
+            raise ValueError(f"A grid search needs a list of values for {name!r}")
+    names = list(space)
+    return [
+        {**SWEEP_PARAMS, **dict(zip(names, values))}
+        for values in itertools.product(*(space[name] for name in names))
+    ]
+
+
+def sample_value(spec, rng):
+    if not isinstance(spec, dict):
+        return rng.choice(spec)
+    low, high = spec["min"], spec["max"]
+    if spec.get("log"):
+        return math.exp(rng.uniform(math.log(low), math.log(high)))
+    return rng.uniform(low, high)
+
+
+def random_configs(space, trials, seed=0):
+    """``trials`` configurations drawn from ``space``: ranges uniformly (or
+    log-uniformly), lists by picking one of the values."""
+    rng = random.Random(seed)
+    return [
+        {
+            **SWEEP_PARAMS,
+            **{name: sample_value(spec, rng) for name, spec in space.items()},
+        }
+        for _ in range(trials)
+    ]
+
+
+def run_name(prefix, trial, seed):
+    return f"{prefix}-{trial:03d}-s{seed}"
+
+
+def train_seed(seed, rung):
+    # A string seeds Random the same way in every process and Python run
+    return random.Random(f"{seed}-{rung}").getrandbits(32)
+
+
+def _run(args):
+    """Train one run's agent for ``episodes`` more games and evaluate it.
+
+    Returns ``(name, mean training score, mean evaluation score)``.
+    """
+    name, episodes, seed, eval_games, eval_seed, width, height = args
+    scores = rl_agent.train(name, episodes, seed, width, height)
+    report = evaluate(name, eval_games, 1, eval_seed, width, height)
+    return name, float(np.mean(scores)), report["score"]["mean"]
+
+
+def sweep(
+    configs,
+    prefix,
+    seeds=(0,),
+    episodes=100,
+    rungs=1,
+    eta=3,
+    eval_games=100,
+    eval_seed=0,
+    workers=None,
+    width=board_width,
+    height=board_height,
+):
+    """Train and evaluate every configuration; return the results, best first.
+
+    Each configuration ``i`` is trained as the agents ``run_name(prefix, i,
+    seed)`` for every seed, which must not exist yet. Rung ``r`` trains the
+    surviving configurations up to ``episodes * eta**r`` games, and all but
+    the best ``1/eta`` of them (at least one) stop after it. A configuration
+    scores the mean over its seeds of ``evaluate``'s mean score on
+    ``eval_games`` games from ``eval_seed``, so all of them are judged on the
+    same food sequences.
+
+    Results are dicts of the parameters, the rung reached, the games trained
+    and the scores; ones that went further rank first, then the higher
+    scores.
+    """
+    for trial in range(len(configs)):
+        for seed in seeds:
+            name = run_name(prefix, trial, seed)
+            if os.path.exists(os.path.join(rl_agent.AGENT_FOLDER, f"{name}.json")):
+                raise ValueError(f"Agent {name} already exists; use another prefix")
+    for trial, config in enumerate(configs):
+        for seed in seeds:
+            rl_agent.create_agent(
+                run_name(prefix, trial, seed),
+                config["learning_rate"],
+                config["discount_factor"],
+                config["exploration_rate"],
+                config["exploration_decay"],
+                config["min_exploration_rate"],
+            )
+
+    results = [{"trial": trial, **config} for trial, config in enumerate(configs)]
+    survivors = list(range(len(configs)))
+    trained = 0
+    with multiprocessing.Pool(workers) as pool:
+        for rung in range(rungs):
+            budget = episodes * eta**rung
+            jobs = [
+                (
+                    run_name(prefix, trial, seed),
+                    budget - trained,
+                    train_seed(seed, rung),
+                    eval_games,
+                    eval_seed,
+                    width,
+                    height,
+                )
+                for trial in survivors
+                for seed in seeds
+            ]
+            runs = iter(pool.map(_run, jobs))
+            for trial in survivors:
+                train_scores, eval_scores = zip(*[next(runs)[1:] for _ in seeds])
+                results[trial].update(
+                    rung=rung,
+                    episodes=budget,
+                    train_score=float(np.mean(train_scores)),
+                    score=float(np.mean(eval_scores)),
+                    score_std=float(np.std(eval_scores)),
+                )
+            trained = budget
+            survivors.sort(key=lambda trial: results[trial]["score"], reverse=True)
+            survivors = survivors[: max(1, len(survivors) // eta)]
+
+    return sorted(results, key=lambda r: (r["rung"], r["score"]), reverse=True)
+
+
+def format_table(results):
+    columns = ["rank", "trial", *SWEEP_PARAMS, "episodes", "train", "score", "std"]
+    rows = [
+        [
+            str(rank),
+            str(result["trial"]),
+            *(f"{result[name]:.4g}" for name in SWEEP_PARAMS),
+            str(result["episodes"]),
+            f"{result['train_score']:.2f}",
+            f"{result['score']:.2f}",
+            f"{result['score_std']:.2f}",
+        ]
+        for rank, result in enumerate(results, 1)
+    ]
+    widths = [max(len(cell) for cell in column) for column in zip(columns, *rows)]
+    return "\n".join(
+        "  ".join(cell.rjust(width) for cell, width in zip(row, widths))
+        for row in [columns, *rows]
+    )
+
+
+def write_csv(path, results):
+    fields = ["rank", "trial", *SWEEP_PARAMS]
+    fields += ["rung", "episodes", "train_score", "score", "score_std"]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        for rank, result in enumerate(results, 1):
+            writer.writerow({"rank": rank, **result})
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Search agent hyperparameters with headless training."
+    )
+    parser.add_argument("space", help="JSON file with the values to search")
+    parser.add_argument(
+        "--search",
+        choices=["grid", "random"],
+        default="grid",
+        help="Try every combination, or sample --trials configurations",
+    )
+    parser.add_argument(
+        "--trials", type=int, default=20, help="Configurations for a random search"
+    )
+    parser.add_argument(
+        "--search-seed", type=int, default=0, help="Seed for a random search"
+    )
+    parser.add_argument(
+        "--prefix", default="sweep", help="Prefix of the agents the runs create"
+    )
+    parser.add_argument(
+        "--seeds",
+        type=int,
+        nargs="+",
+        default=[0],
+        help="Training seeds; every configuration trains once per seed",
+    )
+    parser.add_argument(
+        "--episodes", type=int, default=100, help="Games trained in the first rung"
+    )
+    parser.add_argument(
+        "--rungs",
+        type=int,
+        default=1,
+        help="Rounds of successive halving (1 trains every configuration fully)",
+    )
+    parser.add_argument(
+        "--eta",
+        type=int,
+        default=3,
+        help="Keep the best 1/eta configurations after each rung",
+    )
+    parser.add_argument(
+        "--eval-games", type=int, default=100, help="Greedy games per evaluation"
+    )
+    parser.add_argument(
+        "--eval-seed", type=int, default=0, help="Seed of the evaluation games"
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Number of worker processes (default: all CPUs)"
+    )
+    parser.add_argument(
+        "--width", type=int, default=board_width, help="Board width in cells"
+    )
+    parser.add_argument(
+        "--height", type=int, default=board_height, help="Board height in cells"
+    )
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--csv", help="Also write the results table to this CSV file")
+    args = parser.parse_args()
+
+    try:
+        space = read_space(args.space)
+        if args.search == "grid":
+            configs = grid_configs(space)
+        else:
+            configs = random_configs(space, args.trials, args.search_seed)
+        results = sweep(
+            configs,
+            args.prefix,
+            args.seeds,
+            args.episodes,
+            args.rungs,
+            args.eta,
+            args.eval_games,
+            args.eval_seed,
+            args.workers,
+            args.width,
+            args.height,
+        )
+    except ValueError as e:
+        raise SystemExit(e)
+    print(format_table(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"space": space, "args": vars(args), "results": results}, f, indent=2
+            )
+    if args.csv:
+        write_csv(args.csv, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# train.py
+#
+# Headless training entry point, for machines without a display:
+#
+#     python snake_game/train.py optimus --episodes 1000
+
+import argparse
+import cProfile
+
+import rl_agent
+from parallel_train import parallel_train
+from profiler import Profiler
+from rl_agent import train
+from snake_env import board_height, board_width
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a snake agent headless.")
+    parser.add_argument("agent_name", help="Name of an agent in the agents folder")
+    parser.add_argument(
+        "--episodes", type=int, default=100, help="Number of games to train for"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes (more than 1 trains in parallel)",
+    )
+    parser.add_argument(
+        "--sync-every",
+        type=int,
+        default=50,
+        help="Games each worker plays between Q-table merges",
+    )
+    parser.add_argument("--seed", type=int, help="Seed for a reproducible training run")
+    parser.add_argument(
+        "--width", type=int, default=board_width, help="Board width in cells"
+    )
+    parser.add_argument(
+        "--height", type=int, default=board_height, help="Board height in cells"
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="Time each phase of the training loop and write a JSON report",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="PATH",
+        help="Run under cProfile and write its stats (for pstats or snakeviz)",
+    )
+    args = parser.parse_args()
+
+    if args.profile:
+        # Only this process is instrumented; with --workers the phases cover
+        # the coordinator, not the games played by the worker processes
+        rl_agent.PROFILER = Profiler()
+    if args.cprofile:
+        profile = cProfile.Profile()
+        profile.enable()
+
+    if args.workers > 1:
+        scores = parallel_train(
+            args.agent_name,
+            args.episodes,
+            args.workers,
+            args.sync_every,
+            args.seed,
+            args.width,
+            args.height,
+        )
+    else:
+        scores = train(
+            args.agent_name, args.episodes, args.seed, args.width, args.height
+        )
+    if args.cprofile:
+        profile.disable()
+        profile.dump_stats(args.cprofile)
+    if args.profile:
+        print(rl_agent.PROFILER.format_report())
+        rl_agent.PROFILER.dump_json(args.profile)
+    if scores:
+        print(f"Mean score: {sum(scores) / len(scores):.2f}, best: {max(scores)}")
+
+
+if __name__ == "__main__":
+    main()
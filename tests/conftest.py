@@ -0,0 +1,9 @@
+# conftest.py
+#
+# The game's modules import each other by bare name, as when run from
+# snake_game/, so the tests put that folder on the path.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "snake_game"))
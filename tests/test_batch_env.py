@@ -0,0 +1,57 @@
+# test_batch_env.py
+
+import pytest
+
+from batch_env import DX, DY, BatchSnakeEnv
+from directions import DIRECTIONS
+from snake_env import SnakeEnv
+
+WIDTH, HEIGHT = 12, 10
+
+
+def play_both(actions):
+    """Play ``actions`` in a SnakeEnv and in a one-game BatchSnakeEnv, with
+    the food out of the way, until either game ends.
+
+    Returns both envs' ``(head, state, reward, done)`` after every step.
+    """
+    env = SnakeEnv(0, WIDTH, HEIGHT)
+    batch = BatchSnakeEnv(1, WIDTH, HEIGHT, seed=0)
+    env.food_pos = [WIDTH - 1, HEIGHT - 1]
+    batch.food_x[:], batch.food_y[:] = WIDTH - 1, HEIGHT - 1
+    steps = []
+    for action in actions:
+        state, reward, done = env.step(action)
+        # A game that ends is reset straight away, so work out the head first
+        code = DIRECTIONS.index(action)
+        head = (int(batch.head_x[0] + DX[code]), int(batch.head_y[0] + DY[code]))
+        next_states, rewards, dones = batch.step([code])
+        steps.append(
+            (
+                (tuple(env.snake_pos), tuple(state), reward, done),
+                (head, tuple(bool(f) for f in next_states[0]), rewards[0], dones[0]),
+            )
+        )
+        if done or dones[0]:
+            break
+    return steps
+
+
+@pytest.mark.parametrize(
+    "actions, dies",
+    [
+        (["UP", "LEFT", "LEFT", "DOWN", "DOWN", "RIGHT"], False),
+        # Reversing runs into the neck
+        (["LEFT"], True),
+        (["UP", "LEFT", "RIGHT"], True),
+        (["DOWN", "DOWN", "UP"], True),
+    ],
+)
+def test_batch_env_matches_snake_env(actions, dies):
+    steps = play_both(actions)
+    assert len(steps) == len(actions)
+    for single, batched in steps:
+        assert single[:2] == batched[:2]
+        assert single[2] == pytest.approx(batched[2])
+        assert single[3] == batched[3]
+    assert steps[-1][0][3] == dies
@@ -0,0 +1,74 @@
+# test_q_table.py
+
+import random
+
+import numpy as np
+
+from q_table import ACTION_INDEX, QTable, decode_state, encode_state
+from snake_env import ACTIONS
+
+STATE = decode_state(1234)
+OTHER_STATE = decode_state(77)
+
+
+def dict_best_action(q_dict, state):
+    # The dict-of-dicts table's greedy action (rl_agent.choose_action)
+    state_actions = q_dict.get(state, {})
+    return max(state_actions, key=state_actions.get) if state_actions else None
+
+
+def dict_max_q(q_dict, state):
+    # The dict-of-dicts table's max future Q (rl_agent.update_q_table)
+    return max(q_dict.get(state, {}).values(), default=0)
+
+
+def test_unvisited_state_has_no_greedy_action():
+    table = QTable()
+    assert table.best_action(STATE) is None
+    assert table.max_q(STATE) == 0
+    assert table.get(STATE, "UP") == 0
+
+
+def test_only_visited_actions_count():
+    table = QTable()
+    table.set(STATE, "DOWN", -1.0)
+    # Unvisited actions are 0 in the array but, as missing dict keys, never
+    # beat a visited one, and don't lift max_q to 0
+    assert table.best_action(STATE) == "DOWN"
+    assert table.max_q(STATE) == -1.0
+    assert table.best_action(STATE, ["UP", "LEFT"]) is None
+    assert table.best_action(OTHER_STATE) is None
+
+
+def test_matches_dict_table():
+    rng = random.Random(0)
+    table = QTable()
+    q_dict = {}
+    states = [decode_state(code) for code in rng.sample(range(2**11), 50)]
+    for _ in range(500):
+        state, action = rng.choice(states), rng.choice(ACTIONS)
+        value = rng.uniform(-10, 10)
+        table.set(state, action, value)
+        q_dict.setdefault(state, {})[action] = value
+    for state in states:
+        assert table.best_action(state) == dict_best_action(q_dict, state)
+        assert table.max_q(state) == dict_max_q(q_dict, state)
+    assert table.to_dict() == q_dict
+    assert QTable.from_dict(q_dict).to_dict() == q_dict
+
+
+def test_update_moves_towards_mean_target():
+    table = QTable()
+    table.set(STATE, "UP", 1.0)
+    code, up, left = encode_state(STATE), ACTION_INDEX["UP"], ACTION_INDEX["LEFT"]
+    table.update(
+        np.array([code, code, code]),
+        np.array([up, up, left]),
+        np.array([2.0, 4.0, 5.0]),
+        0.5,
+    )
+    # The pair seen twice moves towards the mean of its targets, once
+    assert table.get(STATE, "UP") == 1.0 + 0.5 * (3.0 - 1.0)
+    assert table.get(STATE, "LEFT") == 0.5 * 5.0
+    assert table.best_action(STATE) == "LEFT"
+    assert table.max_q(OTHER_STATE) == 0
@@ -0,0 +1,57 @@
+# test_replay_buffer.py
+
+import numpy as np
+import pytest
+
+from replay_buffer import ReplayBuffer, SumTree
+
+
+def filled_buffer(capacity, transitions, seed=0):
+    buffer = ReplayBuffer(capacity, prioritized=True, seed=seed)
+    for i in range(transitions):
+        buffer.add(i % 2048, i % 4, -0.1, (i + 1) % 2048, False)
+    return buffer
+
+
+@pytest.mark.parametrize("capacity", [1, 5, 8, 100])
+def test_sum_tree_totals(capacity):
+    rng = np.random.default_rng(0)
+    tree = SumTree(capacity)
+    values = np.zeros(capacity)
+    for _ in range(20):
+        indices = rng.integers(0, capacity, size=7)
+        new = rng.random(7)
+        tree.update(indices, new)
+        values[indices] = new
+        assert tree.total == pytest.approx(values.sum())
+        np.testing.assert_allclose(tree.values(np.arange(capacity)), values)
+
+    # Every leaf owns its slice of the running total
+    filled = np.flatnonzero(values)
+    middles = np.cumsum(values)[filled] - values[filled] / 2
+    np.testing.assert_array_equal(tree.find(middles), filled)
+
+
+def test_prioritized_sampling_follows_priorities():
+    buffer = filled_buffer(8, 12)  # Wrapped around the ring
+    errors = np.array([0.0, 1.0, 3.0, 0.5, 2.0, 0.0, 4.0, 1.5])
+    buffer.update_priorities(np.arange(8), errors)
+    scaled = (np.abs(errors) + 1e-3) ** buffer.alpha
+    probs = scaled / scaled.sum()
+
+    indices, weights = buffer.sample(200_000)
+    counts = np.bincount(indices, minlength=8) / len(indices)
+    np.testing.assert_allclose(counts, probs, atol=0.005)
+
+    expected = (8 * probs[indices]) ** -buffer.beta
+    np.testing.assert_allclose(weights, expected / expected.max())
+
+
+def test_new_transitions_get_the_max_priority():
+    buffer = filled_buffer(100, 10)
+    buffer.update_priorities(np.array([0, 1]), np.array([5.0, 0.1]))
+    buffer.add(1, 0, 1.0, 2, True)
+    buffer.sample(1)
+    scaled = buffer.priorities[: len(buffer)].astype(np.float64) ** buffer.alpha
+    assert buffer.tree.total == pytest.approx(scaled.sum())
+    assert buffer.priorities[10] == pytest.approx(5.001)
@@ -0,0 +1,274 @@
+# test_snapshots.py
+
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import q_table
+from directions import RELATIVE_ACTIONS
+from episode_log import LOG_MAGIC, append_episode, read_episodes
+from q_table import QTable, decode_state, load_saved_table
+
+OPTIMUS_PICKLE = os.path.join(
+    os.path.dirname(__file__), "..", "agents", "optimus_q_table.pkl"
+)
+
+
+def trained_table(seed=0, states=200):
+    rng = np.random.default_rng(seed)
+    table = QTable()
+    for code in rng.choice(len(table.values), states, replace=False):
+        table.set(decode_state(int(code)), "UP", float(rng.normal()))
+        table.set(decode_state(int(code)), "LEFT", float(rng.normal()))
+    return table
+
+
+def touch(table, codes, value):
+    for code in codes:
+        table.set(decode_state(code), "DOWN", value)
+
+
+def assert_same_table(a, b):
+    assert a.encoder == b.encoder
+    assert a.actions == b.actions
+    np.testing.assert_array_equal(a.values, b.values)
+    np.testing.assert_array_equal(a.visited, b.visited)
+    assert a.extra == b.extra
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "q_table.bin"), str(tmp_path / "q_table.delta")
+
+
+def is_basic_state(state):
+    return (
+        isinstance(state, tuple)
+        and len(state) == 11
+        and all(isinstance(feature, bool) for feature in state)
+    )
+
+
+def test_pickle_round_trip():
+    with open(OPTIMUS_PICKLE, "rb") as f:
+        q_dict = pickle.load(f)
+    table = QTable.load(OPTIMUS_PICKLE)
+    assert table.to_dict() == q_dict
+    assert QTable.from_bytes(table.to_bytes()).to_dict() == q_dict
+
+
+def test_pickle_snapshot_round_trip(paths):
+    # optimus holds both basic states, which go into the dense table, and
+    # states of an older format, which are kept in extra
+    with open(OPTIMUS_PICKLE, "rb") as f:
+        q_dict = pickle.load(f)
+    basic = [state for state in q_dict if is_basic_state(state)]
+    assert 0 < len(basic) < len(q_dict)
+    table = QTable.load(OPTIMUS_PICKLE)
+    assert int(table.visited.any(axis=1).sum()) == len(basic)
+    assert set(table.extra) == set(q_dict) - set(basic)
+    for state in basic:
+        for action, value in q_dict[state].items():
+            assert table.get(state, action) == value
+
+    snapshot_path, _ = paths
+    table.save_snapshot(snapshot_path)
+    loaded = QTable.load_snapshot(snapshot_path)
+    assert_same_table(loaded, table)
+    assert loaded.to_dict() == q_dict
+
+
+def test_corrupt_pickle_raises(tmp_path):
+    path = str(tmp_path / "q_table.pkl")
+    with open(OPTIMUS_PICKLE, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[: len(data) // 2])
+    with pytest.raises(ValueError, match="corrupt Q-table pickle"):
+        load_saved_table(str(tmp_path / "missing.bin"), None, path)
+
+
+def test_snapshot_and_deltas_round_trip(paths):
+    snapshot_path, delta_path = paths
+    table = trained_table()
+    table.save_snapshot(snapshot_path)
+    touch(table, [1, 2, 3], 1.5)
+    assert table.save_delta(delta_path) == 3
+    touch(table, [3, 4], -2.0)
+    assert table.save_delta(delta_path) == 2
+    assert table.save_delta(delta_path) == 0  # Nothing changed
+
+    loaded = QTable.load_snapshot(snapshot_path, delta_path)
+    assert_same_table(loaded, table)
+    assert loaded.delta_sequence == 2
+    # Saving the loaded table carries on the same log
+    touch(loaded, [5], 3.0)
+    loaded.save_delta(delta_path)
+    assert_same_table(QTable.load_snapshot(snapshot_path, delta_path), loaded)
+
+
+def test_relative_snapshot(paths):
+    snapshot_path, _ = paths
+    table = QTable(actions=RELATIVE_ACTIONS)
+    table.set(decode_state(9), "TURN_LEFT", 2.5)
+    table.save_snapshot(snapshot_path)
+    assert QTable.open_snapshot(snapshot_path).actions == RELATIVE_ACTIONS
+    with pytest.raises(ValueError, match="actions"):
+        QTable.open_snapshot(snapshot_path, actions=QTable().actions)
+
+
+def test_snapshot_checksum_mismatch(paths):
+    snapshot_path, _ = paths
+    trained_table().save_snapshot(snapshot_path)
+    with open(snapshot_path, "r+b") as f:
+        f.seek(q_table.SNAPSHOT_HEADER_SIZE + 100)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 1]))
+    with pytest.raises(ValueError, match="checksum"):
+        QTable.load_snapshot(snapshot_path)
+
+
+def test_truncated_snapshot(paths):
+    snapshot_path, _ = paths
+    trained_table().save_snapshot(snapshot_path)
+    os.truncate(snapshot_path, os.path.getsize(snapshot_path) - 10)
+    with pytest.raises(ValueError, match="truncated"):
+        QTable.load_snapshot(snapshot_path)
+    os.truncate(snapshot_path, 20)
+    with pytest.raises(ValueError, match="truncated"):
+        QTable.load_snapshot(snapshot_path)
+
+
+def test_delta_checksum_mismatch(paths):
+    snapshot_path, delta_path = paths
+    table = trained_table()
+    table.save_snapshot(snapshot_path)
+    touch(table, [1, 2, 3], 1.5)
+    table.save_delta(delta_path)
+    touch(table, [4], 1.5)
+    table.save_delta(delta_path)
+    with open(delta_path, "r+b") as f:
+        f.seek(q_table.DELTA_HEADER.size + 5)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 1]))
+    with pytest.raises(ValueError, match="checksum"):
+        QTable.load_snapshot(snapshot_path, delta_path)
+
+
+def test_delta_bad_magic(paths):
+    snapshot_path, delta_path = paths
+    table = trained_table()
+    table.save_snapshot(snapshot_path)
+    touch(table, [1], 1.5)
+    table.save_delta(delta_path)
+    with open(delta_path, "r+b") as f:
+        f.write(b"X")
+    with pytest.raises(ValueError, match="corrupt delta record at byte 0"):
+        QTable.load_snapshot(snapshot_path, delta_path)
+
+
+def test_deltas_of_an_older_snapshot_are_skipped(paths):
+    snapshot_path, delta_path = paths
+    table = trained_table()
+    table.save_snapshot(snapshot_path)
+    touch(table, [1, 2], 1.5)
+    table.save_delta(delta_path)
+    # A crash after the new snapshot is written but before the log is
+    # emptied leaves the old records behind
+    touch(table, [3], -1.0)
+    table.save_snapshot(snapshot_path)
+    loaded = QTable.load_snapshot(snapshot_path, delta_path)
+    assert_same_table(loaded, table)
+    assert loaded.delta_sequence == 0
+
+
+def test_torn_delta_append(paths):
+    snapshot_path, delta_path = paths
+    table = trained_table()
+    table.save_snapshot(snapshot_path)
+    touch(table, [1, 2], 1.5)
+    table.save_delta(delta_path)
+    saved = table.copy()
+    complete_size = os.path.getsize(delta_path)
+    touch(table, [3, 4], -1.0)
+    table.save_delta(delta_path)
+    os.truncate(delta_path, os.path.getsize(delta_path) - 7)
+
+    # The torn record is dropped, and the table is as of the save before
+    loaded = QTable.load_snapshot(snapshot_path, delta_path)
+    assert_same_table(loaded, saved)
+    assert loaded.delta_log_size == complete_size
+
+    # The next save cuts it off before appending
+    touch(loaded, [5], 2.0)
+    loaded.save_delta(delta_path)
+    assert_same_table(QTable.load_snapshot(snapshot_path, delta_path), loaded)
+
+    # A header cut short is a torn append too
+    with open(delta_path, "ab") as f:
+        f.write(q_table.DELTA_MAGIC[:5])
+    assert_same_table(QTable.load_snapshot(snapshot_path, delta_path), loaded)
+
+
+def test_failed_snapshot_write_keeps_generation(paths, monkeypatch):
+    snapshot_path, delta_path = paths
+    table = trained_table()
+    table.save_snapshot(snapshot_path)
+    generation = table.generation
+    touch(table, [1], 1.5)
+
+    def fail(path, data):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(q_table, "atomic_write_bytes", fail)
+    with pytest.raises(OSError):
+        table.save_snapshot(snapshot_path)
+    monkeypatch.undo()
+
+    # Its deltas still apply to the snapshot on disk
+    assert table.generation == generation
+    table.save_delta(delta_path)
+    assert_same_table(QTable.load_snapshot(snapshot_path, delta_path), table)
+
+
+def test_episode_log_round_trip(tmp_path):
+    path = str(tmp_path / "episodes.log")
+    state, next_state = decode_state(5), decode_state(6)
+    history = [(state, "UP", -0.5, next_state), (next_state, "TURN_LEFT", 1.0, state)]
+    append_episode(path, 1, history, 1234)
+    append_episode(path, 0, history[:1], 99)
+    assert list(read_episodes(path)) == [(1, history, 1234), (0, history[:1], 99)]
+
+    # A record cut short by a crash is ignored
+    os.truncate(path, os.path.getsize(path) - 3)
+    assert list(read_episodes(path)) == [(1, history, 1234)]
+
+
+@pytest.mark.parametrize("name", ["episodes.log", "episodes.log.gz"])
+def test_episode_log_append_after_torn_episode(tmp_path, name):
+    path = str(tmp_path / name)
+    state, next_state = decode_state(5), decode_state(6)
+    episodes = [
+        (score, [(state, "UP", score / 2, next_state)] * (score + 1), score)
+        for score in range(40)
+    ]
+    for episode in episodes[:3]:
+        append_episode(path, *episode)
+    # A crash cuts the last episode short; later appends start after the
+    # episode before it
+    os.truncate(path, os.path.getsize(path) - 3)
+    for episode in episodes[3:]:
+        append_episode(path, *episode)
+    assert list(read_episodes(path)) == episodes[:2] + episodes[3:]
+
+
+def test_episode_log_needs_magic(tmp_path):
+    path = str(tmp_path / "episodes.log")
+    with open(path, "wb") as f:
+        f.write(b"\x00" * (len(LOG_MAGIC) + 20))
+    with pytest.raises(ValueError, match="not an episode log"):
+        list(read_episodes(path))